@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Compression benchmark for PTMem
+Measures conversion throughput for plain and compressed inputs and outputs.
+"""
+
+import argparse
+import bz2
+import gzip
+import lzma
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from ptmem.main import main as ptmem_main  # noqa: E402
+
+CODECS = {
+    "plain": (None, lambda data: data),
+    "gzip": (".gz", gzip.compress),
+    "bz2": (".bz2", bz2.compress),
+    "xz": (".xz", lzma.compress),
+}
+
+
+def generate_deck(cards):
+    """Generate a synthetic deck with the given number of cards."""
+    lines = []
+    for card_num in range(cards):
+        if card_num % 100 == 0:
+            lines.append(f"# Category {card_num // 100}")
+            lines.append("")
+        lines.append(f"- Question {card_num}: what is {card_num} squared?")
+        lines.append(f"+ {card_num * card_num}")
+        lines.append(f"+ Also written as {card_num}^2")
+        lines.append("")
+    return "\n".join(lines).encode()
+
+
+def run(argv):
+    """Run ptmem with the given arguments and return the elapsed time."""
+    start_time = time.perf_counter()
+    with patch("sys.argv", ["ptmem", *argv]):
+        ptmem_main()
+    return time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PTMem compression")
+    parser.add_argument(
+        "-n", "--cards", type=int, default=100_000, help="Number of cards"
+    )
+    parser.add_argument(
+        "-t",
+        "--output-type",
+        default="json",
+        help="Output type to benchmark (default: json)",
+    )
+    args = parser.parse_args()
+
+    deck = generate_deck(args.cards)
+    size_mb = len(deck) / (1024 * 1024)
+    print(f"Deck: {args.cards} cards, {size_mb:.1f} MB uncompressed")
+    print(f"{'codec':<8}{'read MB/s':>12}{'write MB/s':>12}{'ratio':>8}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, (extension, compress) in CODECS.items():
+            input_path = os.path.join(tmpdir, f"deck.ptmem{extension or ''}")
+            with open(input_path, "wb") as f:
+                f.write(compress(deck))
+            ratio = len(deck) / os.path.getsize(input_path)
+
+            # Reading: compressed input, plain output
+            plain_output = os.path.join(tmpdir, "read.out")
+            read_time = run([input_path, plain_output, "-t", args.output_type])
+
+            # Writing: plain input, compressed output
+            plain_input = os.path.join(tmpdir, "deck.ptmem")
+            with open(plain_input, "wb") as f:
+                f.write(deck)
+            output_path = os.path.join(tmpdir, f"write.out{extension or ''}")
+            write_time = run([plain_input, output_path, "-t", args.output_type])
+
+            print(
+                f"{name:<8}{size_mb / read_time:>12.1f}"
+                f"{size_mb / write_time:>12.1f}{ratio:>8.1f}"
+            )
+            for path in [plain_output, output_path]:
+                os.unlink(path)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
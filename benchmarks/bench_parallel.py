@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Parallel parsing benchmark for PTMem
+Compares sequential parsing with process and thread workers over several
+inputs. Run it with both a regular and a free-threaded (python3.13t) build:
+thread workers only parse in parallel when the GIL is disabled.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from ptmem.parallel import gil_enabled, parse_parallel  # noqa: E402
+from ptmem.parser import iter_input_lines, parse_cards  # noqa: E402
+
+
+def generate_deck(cards, offset=0):
+    """Generate a synthetic deck with the given number of cards."""
+    lines = []
+    for card_num in range(offset, offset + cards):
+        if card_num % 100 == 0:
+            lines.append(f"# Category {card_num // 100}")
+            lines.append("")
+        lines.append(f"- Question {card_num}: what is {card_num} squared?")
+        lines.append(f"+ {card_num * card_num}")
+        lines.append(f"+ Also written as {card_num}^2")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def timed(cards):
+    """Consume ``cards`` and return the card count and elapsed time."""
+    start_time = time.perf_counter()
+    count = sum(1 for _ in cards)
+    return count, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PTMem parallel parsing")
+    parser.add_argument(
+        "-n", "--cards", type=int, default=100_000, help="Number of cards per file"
+    )
+    parser.add_argument("-f", "--files", type=int, default=4, help="Number of files")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of workers (default: CPU count)",
+    )
+    args = parser.parse_args()
+
+    print(f"Python {sys.version.split()[0]}, GIL enabled: {gil_enabled()}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = []
+        for n in range(args.files):
+            path = os.path.join(tmpdir, f"deck{n}.ptmem")
+            with open(path, "w") as f:
+                f.write(generate_deck(args.cards, n * args.cards))
+            paths.append(path)
+        size_mb = sum(map(os.path.getsize, paths)) / (1024 * 1024)
+        print(f"Input: {args.files} files, {size_mb:.1f} MB, {args.jobs} jobs")
+        print(f"{'mode':<12}{'cards':>10}{'seconds':>10}{'MB/s':>10}")
+
+        modes = {
+            "sequential": lambda: parse_cards(iter_input_lines(paths)),
+            "processes": lambda: parse_parallel(paths, args.jobs),
+            "threads": lambda: parse_parallel(paths, args.jobs, threads=True),
+        }
+        for name, parse in modes.items():
+            count, elapsed = timed(parse())
+            print(f"{name:<12}{count:>10}{elapsed:>10.2f}{size_mb / elapsed:>10.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
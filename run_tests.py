@@ -150,6 +150,19 @@ def main():
         "test_edge_cases.py - Edge cases and error conditions",
         "test_cli.py - Command-line interface tests",
         "test_integration.py - End-to-end integration tests",
+        "test_categories.py - Nested category tests",
+        "test_depfile.py - Dependency file tests",
+        "test_diff.py - Deck diff tests",
+        "test_flash.py - fla.sh format tests",
+        "test_history.py - Review history log tests",
+        "test_loaders.py - Output loader tests",
+        "test_parallel.py - Parallel parsing tests",
+        "test_sample.py - Sampling and shuffling tests",
+        "test_search.py - Search index tests",
+        "test_shared.py - Shared memory deck tests",
+        "test_similar.py - Near-duplicate detection tests",
+        "test_sort.py - Sorted output tests",
+        "test_stamp.py - Unchanged output and --no-clobber-identical tests",
     ]
     for test_file in test_files:
         print(f"  • {test_file}")
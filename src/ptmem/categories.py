@@ -0,0 +1,163 @@
+import fnmatch
+
+SEPARATOR = "/"
+
+
+def split_category(category, separator=SEPARATOR):
+    """Split a category like ``Biology/Cells`` into its path of names, with
+    surrounding spaces removed. A card without a category has an empty
+    path."""
+    if category is None:
+        return ()
+    return tuple(part.strip() for part in category.split(separator))
+
+
+def match_path(pattern, path):
+    """Return whether the category path ``path`` matches ``pattern``, a path
+    whose names may contain shell wildcards. A ``**`` name matches any number
+    of names, including none."""
+    if not pattern:
+        return not path
+    if pattern[0] == "**":
+        return any(match_path(pattern[1:], path[i:]) for i in range(len(path) + 1))
+    return bool(path) and (
+        fnmatch.fnmatchcase(path[0], pattern[0]) and match_path(pattern[1:], path[1:])
+    )
+
+
+def filter_category(cards, pattern, separator=SEPARATOR):
+    """Yield the cards whose category matches ``pattern`` (see
+    :func:`match_path`). Each distinct category is only matched once."""
+    pattern = split_category(pattern, separator)
+    matches = {}
+    for card in cards:
+        category = card["category"]
+        matched = matches.get(category)
+        if matched is None:
+            matched = matches[category] = match_path(
+                pattern, split_category(category, separator)
+            )
+        if matched:
+            yield card
+
+
+class CategoryNode:
+    """A category in a :class:`CategoryTrie`.
+
+    ``count`` is the number of cards in the category itself and ``total``
+    that of its whole subtree. ``ranges`` holds the ``[start, end)`` card ID
+    ranges of the category's own cards; consecutive cards share one range.
+    """
+
+    __slots__ = ("name", "children", "count", "total", "ranges")
+
+    def __init__(self, name):
+        self.name = name
+        self.children = {}
+        self.count = 0
+        self.total = 0
+        self.ranges = []
+
+    def walk(self):
+        """Yield this node and every node below it, depth first."""
+        yield self
+        for child in self.children.values():
+            yield from child.walk()
+
+
+class CategoryTrie:
+    """Hierarchical categories of a deck, with the card IDs in each.
+
+    Card IDs are positions in the card stream, as in a search index or a
+    shared deck. :meth:`index` builds the trie in the same pass that parses
+    the cards, and :meth:`select` finds the cards of a subtree by walking only
+    the matching nodes.
+    """
+
+    def __init__(self, separator=SEPARATOR):
+        self.separator = separator
+        self.root = CategoryNode("")
+        self.count = 0
+
+    def add(self, category):
+        """Record the next card, whose category is ``category``, and return
+        its ID."""
+        card_id = self.count
+        self.count += 1
+        node = self.root
+        node.total += 1
+        for name in split_category(category, self.separator):
+            child = node.children.get(name)
+            if child is None:
+                child = node.children[name] = CategoryNode(name)
+            node = child
+            node.total += 1
+        node.count += 1
+        if node.ranges and node.ranges[-1][1] == card_id:
+            node.ranges[-1][1] += 1
+        else:
+            node.ranges.append([card_id, card_id + 1])
+        return card_id
+
+    def index(self, cards):
+        """Add each of ``cards`` to the trie as it passes through."""
+        for card in cards:
+            self.add(card["category"])
+            yield card
+
+    def find(self, category):
+        """Return the node of ``category``, or ``None``."""
+        node = self.root
+        for name in split_category(category, self.separator):
+            node = node.children.get(name)
+            if node is None:
+                return None
+        return node
+
+    def nodes(self, pattern):
+        """Yield the nodes whose path matches ``pattern`` (see
+        :func:`match_path`)."""
+        pattern = split_category(pattern, self.separator)
+
+        def visit(node, pattern):
+            if not pattern:
+                yield node
+            elif pattern[0] == "**":
+                if len(pattern) == 1:
+                    # The common case: a whole subtree
+                    yield from node.walk()
+                    return
+                yield from visit(node, pattern[1:])
+                for child in node.children.values():
+                    yield from visit(child, pattern)
+            else:
+                for name, child in node.children.items():
+                    if fnmatch.fnmatchcase(name, pattern[0]):
+                        yield from visit(child, pattern[1:])
+
+        # A pattern such as a/**/**/b can reach a node twice
+        seen = set()
+        for node in visit(self.root, pattern):
+            if id(node) not in seen:
+                seen.add(id(node))
+                yield node
+
+    def select(self, pattern):
+        """Return the sorted, merged ``[start, end)`` ranges of the IDs of the
+        cards whose category matches ``pattern``.
+
+        Only matching nodes are visited, so the cost depends on the size of
+        the selection rather than of the deck.
+        """
+        ranges = sorted(
+            tuple(card_range)
+            for node in self.nodes(pattern)
+            for card_range in node.ranges
+        )
+        merged = []
+        for start, end in ranges:
+            if merged and merged[-1][1] == start:
+                merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        return [tuple(card_range) for card_range in merged]
@@ -0,0 +1,146 @@
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import os
+import threading
+
+try:
+    from compression import zstd
+except ImportError:  # zstd is only in the standard library from Python 3.14
+    zstd = None
+
+# Compressed streams are read and written through buffers this large so the
+# codecs work on big blocks instead of one line at a time.
+BUFFER_SIZE = 1024 * 1024
+
+MAGIC_NUMBERS = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+
+EXTENSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".zst": "zstd",
+}
+
+
+def _codec(name):
+    codecs = {"gzip": gzip, "bz2": bz2, "xz": lzma, "zstd": zstd}
+    module = codecs[name]
+    if module is None:
+        raise RuntimeError(f"{name} compression requires Python 3.14 or later")
+    return module
+
+
+def _compression_of(magic):
+    for prefix, name in MAGIC_NUMBERS:
+        if magic.startswith(prefix):
+            return name
+    return None
+
+
+def detect_compression(path):
+    """Return the compression of the file at ``path`` from its magic bytes, or
+    ``None`` if it is not compressed."""
+    with open(path, "rb") as f:
+        return _compression_of(f.read(6))
+
+
+def compression_for_path(path):
+    """Return the compression implied by the extension of ``path``, or
+    ``None``."""
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def temp_path(path):
+    """Return a temporary path next to ``path`` to write it atomically,
+    distinct for every process and thread that writes it."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def open_input(path, mode="r"):
+    """Open ``path`` for reading text (or bytes if ``mode`` is ``"rb"``),
+    decompressing it on the fly if its magic bytes show it is compressed.
+
+    The file is opened only once and its magic bytes are peeked at without
+    consuming them, so pipes and other unseekable files can be read too.
+    """
+    f = open(path, "rb")
+    try:
+        name = _compression_of(f.peek(6)[:6])
+        if name is not None:
+            f = _OwningReader(_codec(name).open(f, "rb"), f)
+    except BaseException:
+        f.close()
+        raise
+    return f if mode == "rb" else io.TextIOWrapper(f)
+
+
+class _OwningReader(io.BufferedReader):
+    # Buffers a decompressor and closes the file under it, which the codecs
+    # leave open when they are given a file object
+
+    def __init__(self, raw, file):
+        super().__init__(raw, BUFFER_SIZE)
+        self.file = file
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.file.close()
+
+
+def open_output(path, compression=None, newline=None, digest=None):
+    """Open ``path`` for writing text, compressing it with ``compression``
+    (one of the names in :data:`EXTENSIONS`) if given.
+
+    If ``digest`` (a :mod:`hashlib` object) is given, it is updated with the
+    uncompressed bytes as they are written.
+    """
+    if digest is None:
+        if compression is None:
+            return open(path, "w", newline=newline)
+        stream = _codec(compression).open(path, "wb")
+    else:
+        if compression is None:
+            stream = open(path, "wb", buffering=0)
+        else:
+            stream = _codec(compression).open(path, "wb")
+        stream = _DigestWriter(stream, digest)
+    return io.TextIOWrapper(io.BufferedWriter(stream, BUFFER_SIZE), newline=newline)
+
+
+class _DigestWriter(io.RawIOBase):
+    # Feeds everything written through it to a digest. It sits under the
+    # buffer, so the digest is updated once per block rather than per write.
+
+    def __init__(self, stream, digest):
+        self.stream = stream
+        self.digest = digest
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        written = self.stream.write(data)
+        self.digest.update(memoryview(data)[:written])
+        return written
+
+    def close(self):
+        if not self.closed:
+            self.stream.close()
+        super().close()
+
+
+def file_digest(path, name="sha256"):
+    """Return the digest of the uncompressed content of the file at
+    ``path``."""
+    with open_input(path, "rb") as f:
+        return hashlib.file_digest(f, name).digest()
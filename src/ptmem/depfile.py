@@ -0,0 +1,36 @@
+import os
+import re
+
+from .compress import temp_path
+
+# Backslashes are only special before the characters they escape
+_SPECIAL = re.compile(r"(\\*)([ #])")
+
+
+def escape_path(path):
+    """Escape ``path`` for a Makefile rule, as gcc does in its depfiles."""
+    path = _SPECIAL.sub(lambda m: m.group(1) * 2 + "\\" + m.group(2), path)
+    return path.replace("$", "$$")
+
+
+def format_depfile(targets, prerequisites, phony=()):
+    """Return a Makefile rule making ``targets`` depend on ``prerequisites``.
+
+    Each path in ``phony`` also gets an empty rule of its own, like gcc's
+    ``-MP``, so make does not fail once that file is deleted.
+    """
+    lines = [" ".join(map(escape_path, targets)) + ":"]
+    for path in dict.fromkeys(prerequisites):
+        lines[-1] += " \\"
+        lines.append(f"  {escape_path(path)}")
+    for path in dict.fromkeys(phony):
+        lines += ["", f"{escape_path(path)}:"]
+    return "\n".join(lines) + "\n"
+
+
+def write_depfile(path, targets, prerequisites, phony=()):
+    """Write the rule from :func:`format_depfile` to ``path``."""
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w") as f:
+        f.write(format_depfile(targets, prerequisites, phony))
+    os.replace(tmp_path, path)
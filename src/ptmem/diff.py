@@ -0,0 +1,117 @@
+import hashlib
+import json
+from collections import deque
+from typing import NamedTuple
+
+from .compress import open_input
+from .flash import iter_lines
+from .loaders import iter_ndjson, load_json
+from .parser import SourceMap, iter_input_lines, parse_cards
+
+
+class Entry(NamedTuple):
+    """A card read from one side of a diff, with where it was found and, for
+    fla.sh files, its confidence."""
+
+    card: dict
+    location: str
+    confidence: str = None
+
+
+class Change(NamedTuple):
+    """One difference between two decks.
+
+    ``kind`` is ``added``, ``removed``, ``modified`` or ``confidence``; ``old``
+    and ``new`` are the :class:`Entry` on each side, or ``None``.
+    """
+
+    kind: str
+    old: Entry
+    new: Entry
+
+
+def _digest(*fields):
+    return hashlib.blake2b(
+        json.dumps(fields, ensure_ascii=False).encode(), digest_size=16
+    ).digest()
+
+
+def card_key(card):
+    """Hash of everything that makes up a card."""
+    return _digest(card["category"], card["questions"], card["answers"])
+
+
+def question_key(card):
+    """Hash of a card's category and questions, used to pair up cards whose
+    answers changed."""
+    return _digest(card["category"], card["questions"])
+
+
+def iter_entries(path, input_type="ptmem"):
+    """Yield an :class:`Entry` for each card in ``path``.
+
+    ``input_type`` is ``ptmem`` for sources, parsed with the same rules as
+    conversion, or ``json``, ``ndjson`` or ``fla.sh`` for generated outputs.
+    ``—`` in version 1 fla.sh files is read as ``:``, so either version can be
+    compared with the other.
+    """
+    if input_type == "ptmem":
+        source_map = SourceMap()
+        for card in parse_cards(iter_input_lines([path]), source_map=source_map):
+            filename, lineno = source_map.last()
+            yield Entry(card, f"{filename}:{lineno}")
+    elif input_type in ("json", "ndjson"):
+        cards = load_json(path) if input_type == "json" else iter_ndjson(path)
+        for n, card in enumerate(cards, 1):
+            yield Entry(card, f"{path}#{n}")
+    elif input_type == "fla.sh":
+        with open_input(path) as f:
+            for lineno, card, confidence in iter_lines(f, restore_colons=True):
+                yield Entry(card, f"{path}:{lineno}", confidence)
+    else:
+        raise ValueError(f"unknown input type: {input_type!r}")
+
+
+def diff_entries(old, new):
+    """Compare two streams of :class:`Entry` and yield a :class:`Change` for
+    each difference.
+
+    This is a hash join: ``old`` is loaded into a table keyed by
+    :func:`card_key` and ``new`` is streamed against it, so the run time is
+    linear. Unmatched cards are then paired by :func:`question_key` to find
+    modified cards. Confidence changes are reported as they are found, then
+    modified, added and removed cards in input order.
+    """
+    table = {}
+    for n, entry in enumerate(old):
+        table.setdefault(card_key(entry.card), deque()).append((n, entry))
+
+    unmatched = []
+    for entry in new:
+        matches = table.get(card_key(entry.card))
+        if matches:
+            _, previous = matches.popleft()
+            if previous.confidence != entry.confidence and None not in (
+                previous.confidence,
+                entry.confidence,
+            ):
+                yield Change("confidence", previous, entry)
+        else:
+            unmatched.append(entry)
+
+    remaining = {}
+    for matches in table.values():
+        for n, entry in matches:
+            remaining.setdefault(question_key(entry.card), deque()).append((n, entry))
+
+    for entry in unmatched:
+        matches = remaining.get(question_key(entry.card))
+        if matches:
+            _, previous = matches.popleft()
+            yield Change("modified", previous, entry)
+        else:
+            yield Change("added", None, entry)
+
+    removed = sorted(pair for matches in remaining.values() for pair in matches)
+    for _, entry in removed:
+        yield Change("removed", entry, None)
@@ -0,0 +1,372 @@
+import contextlib
+import mmap
+import os
+import re
+import sys
+from array import array
+
+from .compress import detect_compression, open_input
+from .parser import IncludeError, Includes
+
+
+# First line of a version 2 file. Version 1 files have no header.
+HEADER_V2 = "# fla.sh v2"
+_HEADER_V2_BYTES = HEADER_V2.encode()
+
+# Version 2 escapes the field and list separators with a backslash, so fields
+# survive a round trip exactly
+_ESCAPES = str.maketrans(
+    {"\\": "\\\\", ":": "\\c", ";": "\\s", "\n": "\\n", "\r": "\\r"}
+)
+_UNESCAPES = {"\\": "\\", "c": ":", "s": ";", "n": "\n", "r": "\r"}
+_ESCAPE_SEQUENCE = re.compile(r"\\(.)")
+
+
+def escape(field):
+    """Escape a version 2 field or list item."""
+    return field.translate(_ESCAPES)
+
+
+def unescape(field):
+    """Undo :func:`escape`. Unknown escape sequences stand for the escaped
+    character itself."""
+    if "\\" not in field:
+        return field
+    return _ESCAPE_SEQUENCE.sub(lambda m: _UNESCAPES.get(m[1], m[1]), field)
+
+
+def format_content(card):
+    """Return the ``category:questions:answers`` part of a card's fla.sh line.
+
+    Colons inside fields are replaced with ``—`` and multiple questions or
+    answers are joined with ``; ``.
+    """
+    return f"{(card['category'] or '').replace(':', '—')}:{'; '.join(card['questions']).replace(':', '—')}:{'; '.join(card['answers']).replace(':', '—')}"
+
+
+def format_content_v2(card):
+    """Return the ``category:questions:answers`` part of a card's version 2
+    fla.sh line.
+
+    Fields are escaped with :func:`escape` and multiple questions or answers
+    are joined with ``;``, so the line can be split on ``:`` and ``;`` without
+    ambiguity.
+    """
+    return ":".join(
+        [
+            escape(card["category"] or ""),
+            ";".join(map(escape, card["questions"])),
+            ";".join(map(escape, card["answers"])),
+        ]
+    )
+
+
+def parse_line(line):
+    """Split a fla.sh line into ``(card, confidence)``.
+
+    Returns ``None`` for blank or malformed lines. The ``—`` substitution made
+    by :func:`format_content` cannot be undone, so fields are returned as they
+    appear in the file.
+    """
+    parts = line.strip().split(":")
+    if len(parts) != 4:
+        return None
+    category, questions, answers, confidence = parts
+    card = {
+        "questions": questions.split("; ") if questions else [],
+        "answers": answers.split("; ") if answers else [],
+        "category": category,
+    }
+    return card, confidence
+
+
+def parse_line_v2(line):
+    """Split a version 2 fla.sh line into ``(card, confidence)``, unescaping
+    every field. Returns ``None`` for blank or malformed lines."""
+    parts = line.rstrip("\r\n").split(":")
+    if len(parts) != 4:
+        return None
+    category, questions, answers, confidence = parts
+    card = {
+        "questions": [unescape(q) for q in questions.split(";")] if questions else [],
+        "answers": [unescape(a) for a in answers.split(";")] if answers else [],
+        "category": unescape(category),
+    }
+    return card, confidence
+
+
+def iter_lines(f, restore_colons=False):
+    """Yield ``(lineno, card, confidence)`` for each card in the open fla.sh
+    file ``f`` of either version.
+
+    With ``restore_colons``, each ``—`` in a version 1 file is turned back into
+    the ``:`` it most likely replaced.
+    """
+    parse = parse_line
+    for lineno, line in enumerate(f, 1):
+        if lineno == 1 and line.rstrip("\r\n") == HEADER_V2:
+            parse = parse_line_v2
+            continue
+        parsed = parse(line)
+        if parsed is None:
+            continue
+        card, confidence = parsed
+        if restore_colons and parse is parse_line:
+            card = {
+                "questions": [q.replace("—", ":") for q in card["questions"]],
+                "answers": [a.replace("—", ":") for a in card["answers"]],
+                "category": card["category"].replace("—", ":"),
+            }
+        yield lineno, card, confidence
+
+
+# Content formatter for each fla.sh version
+CONTENT_FORMATS = {1: format_content, 2: format_content_v2}
+
+
+_DASH = "—".encode()
+_CR = ord("\r")
+# The ASCII characters str.strip removes
+_ASCII_WHITESPACE = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+
+
+def _strip_line(line):
+    # Strip a UTF-8 line given as bytes exactly like str.strip would
+    line = line.strip(_ASCII_WHITESPACE)
+    if line and not line.isascii() and (line[0] > 0x7F or line[-1] > 0x7F):
+        # str.strip also removes Unicode whitespace
+        line = line.decode().strip().encode()
+    return line
+
+
+def _iter_input_bytes(inputs):
+    # Like parser.iter_input_lines, but lines are left as bytes. Line breaks
+    # are found as text mode would, including a lone \r.
+    if len(inputs) == 1 and inputs[0] == "-":
+        files = [("<stdin>", contextlib.nullcontext(sys.stdin.buffer))]
+    else:
+        files = [(path, open_input(path, "rb")) for path in inputs]
+    for filename, opened in files:
+        with opened as f:
+            lineno = 0
+            for line in f:
+                # Searching for an int is much faster than for b"\r"
+                if _CR in line:
+                    for line in line.splitlines():
+                        lineno += 1
+                        yield filename, lineno, line
+                else:
+                    lineno += 1
+                    yield filename, lineno, line
+
+
+def iter_contents(inputs, includes=None):
+    """Yield the fla.sh content of every card in the PTMem files ``inputs`` as
+    UTF-8 bytes.
+
+    The result is ``format_content(card).encode()`` for each card
+    :func:`~ptmem.parser.parse_cards` would yield, but lines are parsed and
+    fields joined and escaped as bytes, without decoding the input or
+    building card dicts. Only cards included with ``@`` lines are decoded.
+    """
+    if includes is None:
+        includes = Includes()
+    questions = []
+    answers = []
+    category = b""
+
+    def content():
+        return b":".join(
+            (
+                category,
+                b"; ".join(questions).replace(b":", _DASH),
+                b"; ".join(answers).replace(b":", _DASH),
+            )
+        )
+
+    for filename, lineno, line in _iter_input_bytes(inputs):
+        line = _strip_line(line)
+        if line.startswith(b"- "):
+            questions.append(line[2:])
+        elif line.startswith(b"+ "):
+            answers.append(line[2:])
+        elif line.startswith(b"# "):
+            category = line[2:].replace(b":", _DASH)
+        elif line.startswith(b"/ "):
+            continue
+        elif not line:
+            if questions:
+                yield content()
+                questions = []
+                answers = []
+        elif line.startswith(b"@ "):
+            if questions:
+                yield content()
+                questions = []
+                answers = []
+            path = line[2:].decode().strip()
+            if filename != "<stdin>":
+                path = os.path.join(os.path.dirname(filename), path)
+            try:
+                fragment_cards, _ = includes.load(path)
+            except IncludeError as e:
+                raise IncludeError(f"{filename}:{lineno}: {e}") from None
+            except OSError as e:
+                raise IncludeError(
+                    f"{filename}:{lineno}: cannot include {path}: {e.strerror or e}"
+                ) from None
+            for card in fragment_cards:
+                if card["category"] is None:
+                    yield category + format_content({**card, "category": ""}).encode()
+                else:
+                    yield format_content(card).encode()
+
+    if questions:
+        yield content()
+
+
+def _content_hash(content):
+    # Hashes only need to be consistent within one process, so the built-in
+    # hash is enough; 0 marks an empty slot
+    return (hash(content) & 0xFFFFFFFFFFFFFFFF) or 1
+
+
+class ConfidenceTable:
+    """Confidence of each card in an existing fla.sh file.
+
+    Instead of a dict of full ``category:questions:answers`` strings, cards
+    are keyed by a 64-bit hash of their content in an open-addressing table
+    made of two fixed-width arrays, so a large deck costs about 24 bytes per
+    card. Confidences that are not plain integers (which only malformed files
+    contain) are kept in a small side dict.
+
+    ``version`` is the fla.sh version of the file the table was loaded from,
+    which decides how card content must be formatted to look it up.
+    """
+
+    OTHER = -(2**31)
+
+    def __init__(self, version=1):
+        self.version = version
+        self.count = 0
+        self.hashes = array("Q", [0]) * 1024
+        self.confidences = array("i", [0]) * 1024
+        self.other = {}
+
+    @classmethod
+    def from_file(cls, path):
+        """Load the confidences in the fla.sh file at ``path``.
+
+        Uncompressed files are memory-mapped and read line by line, so the
+        file itself is never held in memory. A version 2 file is recognized by
+        its header line.
+        """
+        table = cls()
+        if detect_compression(path) is not None:
+            with open_input(path, "rb") as f:
+                table.add_first_line(f.readline())
+                for line in f:
+                    table.add_line(line)
+            return table
+
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return table
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                table.add_first_line(mm.readline())
+                for line in iter(mm.readline, b""):
+                    table.add_line(line)
+        return table
+
+    def add_first_line(self, line):
+        """Like :meth:`add_line`, but also detect the version 2 header."""
+        if line.rstrip() == _HEADER_V2_BYTES:
+            self.version = 2
+        self.add_line(line)
+
+    def add_line(self, line):
+        """Record the confidence on a fla.sh line given as bytes.
+
+        Lines are split like the original merge code: everything after the
+        last ``:`` is the confidence, and lines with fewer than four fields
+        are ignored. Version 2 fields may start with whitespace, so only the
+        line ending is removed from version 2 lines.
+        """
+        line = line.rstrip(b"\r\n") if self.version == 2 else line.strip()
+        if line.count(b":") < 3:
+            return
+        content, _, confidence = line.rpartition(b":")
+        # Plain integers, which nearly every line has, are stored without
+        # decoding the confidence; bytes.isdigit only accepts ASCII digits
+        if (
+            confidence.isdigit()
+            and len(confidence) < 10
+            and (len(confidence) == 1 or not confidence.startswith(b"0"))
+        ):
+            self._set(_content_hash(content), int(confidence))
+        else:
+            self.add(content, confidence.decode())
+
+    def add(self, content, confidence):
+        """Set the confidence of the card with ``content`` (UTF-8 bytes)."""
+        value = self.OTHER
+        if (
+            confidence.isascii()
+            and confidence.isdigit()
+            and str(int(confidence)) == confidence
+        ):
+            if int(confidence) < 2**31:
+                value = int(confidence)
+        h = _content_hash(content)
+        if value == self.OTHER:
+            self.other[h] = confidence
+        self._set(h, value)
+
+    def _set(self, h, value):
+        if value != self.OTHER and self.other:
+            self.other.pop(h, None)
+        if 2 * (self.count + 1) > len(self.hashes):
+            self._grow()
+        slot = self._slot(h)
+        if self.hashes[slot] == 0:
+            self.hashes[slot] = h
+            self.count += 1
+        self.confidences[slot] = value
+
+    def get(self, content, default=None):
+        """Return the confidence string for ``content`` (UTF-8 bytes)."""
+        h = _content_hash(content)
+        slot = self._slot(h)
+        if self.hashes[slot] == 0:
+            return default
+        value = self.confidences[slot]
+        return self.other[h] if value == self.OTHER else str(value)
+
+    def get_bytes(self, content, default=None):
+        """Like :meth:`get`, but return the confidence as ASCII bytes."""
+        h = _content_hash(content)
+        slot = self._slot(h)
+        if self.hashes[slot] == 0:
+            return default
+        value = self.confidences[slot]
+        return self.other[h].encode() if value == self.OTHER else b"%d" % value
+
+    def __len__(self):
+        return self.count
+
+    def _slot(self, h):
+        mask = len(self.hashes) - 1
+        slot = h & mask
+        while self.hashes[slot] != 0 and self.hashes[slot] != h:
+            slot = (slot + 1) & mask
+        return slot
+
+    def _grow(self):
+        hashes, confidences = self.hashes, self.confidences
+        self.hashes = array("Q", [0]) * (2 * len(hashes))
+        self.confidences = array("i", [0]) * (2 * len(hashes))
+        for h, value in zip(hashes, confidences):
+            if h != 0:
+                slot = self._slot(h)
+                self.hashes[slot] = h
+                self.confidences[slot] = value
@@ -0,0 +1,149 @@
+import hashlib
+import heapq
+import os
+import struct
+import time
+from typing import NamedTuple
+
+from .compress import temp_path
+from .flash import format_content
+
+MAGIC = b"PTMEMLOG"
+
+# card hash, timestamp (seconds since the epoch), score, response time (ms)
+RECORD = struct.Struct("<8sdiI")
+
+# Records read per chunk by iter_reviews
+CHUNK_RECORDS = 64 * 1024
+
+
+class Review(NamedTuple):
+    card: bytes
+    timestamp: float
+    score: int
+    response_ms: int
+
+
+def content_hash(content):
+    """Return the 8-byte key of a card from its fla.sh ``category:questions:answers``
+    content."""
+    return hashlib.blake2b(content.encode(), digest_size=8).digest()
+
+
+def card_hash(card):
+    """Return the 8-byte key of a card dict."""
+    return content_hash(format_content(card))
+
+
+class ReviewLog:
+    """Append-only binary log of card reviews.
+
+    Each review is a fixed-size record of the card's hash, a timestamp, the
+    score given and the response time, so logging a review never rewrites the
+    deck or the rest of the log. A partial record at the end of an existing
+    log is truncated away when it is opened.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab")
+        size = self.file.seek(0, os.SEEK_END)
+        with open(path, "rb") as f:
+            magic = f.read(len(MAGIC))
+        if magic != MAGIC and not (size < len(MAGIC) and MAGIC.startswith(magic)):
+            self.file.close()
+            raise ValueError(f"{path} is not a ptmem review log")
+        if size < len(MAGIC):
+            self.file.truncate(0)
+            self.file.write(MAGIC)
+        else:
+            # Drop a partial record left by an interrupted write, so new
+            # records stay aligned
+            usable = size - (size - len(MAGIC)) % RECORD.size
+            if usable != size:
+                self.file.truncate(usable)
+
+    def append(self, card, score, response_ms=0, timestamp=None):
+        """Log a review of ``card``, a hash from :func:`card_hash` or
+        :func:`content_hash`."""
+        if timestamp is None:
+            timestamp = time.time()
+        self.file.write(RECORD.pack(card, timestamp, score, response_ms))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_reviews(path):
+    """Yield every :class:`Review` in the log at ``path``, in log order.
+
+    The log is read sequentially in large chunks. A partial record left at
+    the end by an interrupted write is ignored.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a ptmem review log")
+        while True:
+            chunk = f.read(RECORD.size * CHUNK_RECORDS)
+            usable = len(chunk) - len(chunk) % RECORD.size
+            for record in RECORD.iter_unpack(chunk[:usable]):
+                yield Review(*record)
+            if len(chunk) < RECORD.size * CHUNK_RECORDS:
+                return
+
+
+def load_confidences(path):
+    """Rebuild the current score of every card from the log in one pass.
+
+    Returns a dict from card hash to the score of its latest review.
+    """
+    latest = {}
+    for review in iter_reviews(path):
+        previous = latest.get(review.card)
+        if previous is None or review.timestamp >= previous[0]:
+            latest[review.card] = (review.timestamp, review.score)
+    return {card: score for card, (_, score) in latest.items()}
+
+
+def compact(path, keep=1):
+    """Rewrite the log at ``path`` keeping only the latest ``keep`` reviews of
+    each card by timestamp, in chronological order.
+
+    The new log replaces the old one atomically. Returns the number of
+    reviews kept.
+    """
+    if keep < 1:
+        raise ValueError("keep must be at least 1")
+    # A min-heap per card of its latest reviews by timestamp, like
+    # load_confidences picks them; among equal timestamps the later record in
+    # the log counts as later
+    recent = {}
+    for n, review in enumerate(iter_reviews(path)):
+        heap = recent.setdefault(review.card, [])
+        if len(heap) < keep:
+            heapq.heappush(heap, (review.timestamp, n, review))
+        else:
+            heapq.heappushpop(heap, (review.timestamp, n, review))
+    reviews = [
+        review
+        for _, _, review in sorted(entry for heap in recent.values() for entry in heap)
+    ]
+
+    tmp_path = temp_path(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            for review in reviews:
+                f.write(RECORD.pack(*review))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return len(reviews)
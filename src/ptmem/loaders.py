@@ -0,0 +1,50 @@
+import contextlib
+import json
+import sys
+
+from .compress import open_input
+from .flash import iter_lines
+
+
+def _open(path):
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin)
+    return open_input(path)
+
+
+def load_json(path):
+    """Load the cards from a JSON file written by the ``json`` output type."""
+    with _open(path) as f:
+        return json.load(f)
+
+
+def iter_ndjson(path):
+    """Yield the cards in an NDJSON file one line at a time."""
+    with _open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_flash(path, restore_colons=True):
+    """Yield the cards in a fla.sh file of either version one line at a time.
+
+    Each card has a ``confidence`` key holding the score from the end of its
+    line, as a string. Version 2 files are unescaped exactly. In version 1
+    files, multiple questions and answers are split on ``; `` and, with
+    ``restore_colons``, each ``—`` is turned back into the ``:`` the writer
+    replaced; this also changes any ``—`` that was in the source. Blank and
+    malformed lines are skipped.
+    """
+    with _open(path) as f:
+        for _, card, confidence in iter_lines(f, restore_colons=restore_colons):
+            card["confidence"] = confidence
+            yield card
+
+
+# Loader for each output type that can be read back
+LOADERS = {
+    "json": load_json,
+    "ndjson": iter_ndjson,
+    "fla.sh": iter_flash,
+}
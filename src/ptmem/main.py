@@ -1,106 +1,625 @@
-import json
 import argparse
-import sys
+import codecs
+import contextlib
+import itertools
+import locale
 import os
+import random
+import sys
+
+from .flash import iter_contents
+from .categories import SEPARATOR, CategoryTrie, filter_category
+from .depfile import write_depfile
+from .diff import diff_entries, iter_entries
+from .history import compact, load_confidences
+from .loaders import LOADERS
+from .parallel import gil_enabled, parse_parallel
+from .parser import IncludeError, Includes, SourceMap, iter_input_lines, parse_cards
+from .sample import external_shuffle, reservoir_sample
+from .search import SearchIndex, build_index
+from .similar import find_similar
+from .stamp import is_current, stamp_path, write_stamp
+from .sort import RUN_SIZE, SORT_KEYS, confidence_key, external_sort
+from .writers import WRITERS, FlashWriter
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        return COMMANDS[sys.argv[1]](sys.argv[2:])
+    return convert(sys.argv[1:])
+
+
+def convert(argv):
     # Parse command line arguments
-    parser = argparse.ArgumentParser(description="Convert PTMem files to JSON")
+    parser = argparse.ArgumentParser(
+        prog="ptmem",
+        description="Convert PTMem files to JSON",
+        epilog=f"Other commands: {', '.join(COMMANDS)} (see ptmem COMMAND --help)",
+    )
     parser.add_argument("input", nargs="+", help="Input file(s)")
-    parser.add_argument("output", help="Output file")
+    parser.add_argument("output", help="Output file, or - for stdout")
+    parser.add_argument(
+        "-i",
+        "--input-type",
+        choices=["ptmem", *LOADERS],
+        default="ptmem",
+        help="Input file type; anything but ptmem reads back a previous output "
+        "(default: ptmem)",
+    )
     parser.add_argument(
         "-t",
         "--output-type",
-        choices=["json", "fla.sh"],
+        choices=list(WRITERS),
         default="json",
         help="Output file type (default: json)",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "-o",
+        "--also-output",
+        action="append",
+        default=[],
+        metavar="TYPE=PATH",
+        help="Also write the cards as TYPE to PATH from the same parse; may be "
+        "repeated",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Report suspicious input as file:line diagnostics and exit with "
+        "status 1 if any are found",
+    )
+    parser.add_argument(
+        "--max-errors",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Stop after N diagnostics without writing output (implies --check)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Parse the input in N workers",
+    )
+    parser.add_argument(
+        "--workers",
+        choices=["auto", "process", "thread"],
+        default="auto",
+        help="Kind of worker for --jobs. Threads only run in parallel on "
+        "free-threaded Python and parse sequentially otherwise; auto picks "
+        "threads there and processes elsewhere (default: auto)",
+    )
+    parser.add_argument(
+        "--with-source",
+        action="store_true",
+        help="Include the file and line each card starts on in JSON output",
+    )
+    parser.add_argument(
+        "--sort-by",
+        choices=["category", "question", "confidence"],
+        help="Sort cards before writing them, keeping input order for ties. "
+        "confidence uses the scores in the existing fla.sh output",
+    )
+    parser.add_argument(
+        "--sort-run-size",
+        type=int,
+        default=RUN_SIZE,
+        metavar="N",
+        help="Cards sorted or shuffled in memory before spilling to temporary "
+        f"files (default: {RUN_SIZE})",
+    )
+    parser.add_argument(
+        "--shuffle",
+        action="store_true",
+        help="Write the cards in a random order, which --seed makes repeatable",
+    )
+    parser.add_argument("--seed", type=int, help="Random seed for --shuffle")
+    parser.add_argument(
+        "--history",
+        metavar="LOG",
+        help="Take fla.sh confidences from the latest reviews in this review log",
+    )
+    parser.add_argument(
+        "--fuzzy-confidence",
+        type=float,
+        nargs="?",
+        const=0.7,
+        metavar="THRESHOLD",
+        help="Give new fla.sh cards the confidence of a removed card of the "
+        "same category whose text is at least this similar (default: 0.7)",
+    )
+    parser.add_argument(
+        "--category",
+        metavar="PATTERN",
+        help="Only write cards whose category matches PATTERN, a category path "
+        "where * matches one name and ** any number, e.g. 'Biology/**'",
+    )
+    parser.add_argument(
+        "--category-separator",
+        default=SEPARATOR,
+        metavar="SEP",
+        help=f"Separator of nested category names (default: {SEPARATOR})",
+    )
+    parser.add_argument(
+        "--question-joiner",
+        default="; ",
+        help="Separator for multiple questions in csv/tsv output (default: '; ')",
+    )
+    parser.add_argument(
+        "--answer-joiner",
+        default="; ",
+        help="Separator for multiple answers in csv/tsv output (default: '; ')",
+    )
+    parser.add_argument(
+        "--no-clobber-identical",
+        action="store_true",
+        help="Leave outputs whose content would not change untouched, and skip "
+        "the run entirely if no input or output changed since the last one",
+    )
+    parser.add_argument(
+        "-MD",
+        dest="depfile",
+        metavar="DEPFILE",
+        help="Write a Makefile rule listing the input files and included "
+        "fragments the outputs depend on to DEPFILE, as gcc -MD does",
+    )
+    args = parser.parse_args(argv)
+
+    outputs = [(args.output_type, args.output)]
+    for spec in args.also_output:
+        output_type, sep, path = spec.partition("=")
+        if not sep or not path:
+            parser.error(f"-o/--also-output expects TYPE=PATH, got {spec!r}")
+        if output_type not in WRITERS:
+            parser.error(
+                f"invalid output type {output_type!r} in {spec!r} "
+                f"(choose from {', '.join(WRITERS)})"
+            )
+        outputs.append((output_type, path))
+    paths = [path for _, path in outputs]
+    if len(set(paths)) != len(paths):
+        parser.error("each output must be written to a different path")
+    if args.with_source and "json" not in [t for t, _ in outputs]:
+        parser.error("--with-source requires a json output")
+    has_flash = any(issubclass(WRITERS[t], FlashWriter) for t, _ in outputs)
+    if args.sort_by == "confidence" and not has_flash:
+        parser.error("--sort-by confidence requires a fla.sh output")
+    if args.history and not has_flash:
+        parser.error("--history requires a fla.sh output")
+    if args.fuzzy_confidence is not None:
+        if not has_flash:
+            parser.error("--fuzzy-confidence requires a fla.sh output")
+        if not 0 < args.fuzzy_confidence <= 1:
+            parser.error("--fuzzy-confidence must be between 0 and 1")
+        if args.sort_by == "confidence":
+            parser.error("--fuzzy-confidence cannot be used with --sort-by confidence")
+    if args.sort_run_size < 1:
+        parser.error("--sort-run-size must be at least 1")
+    if args.shuffle and args.sort_by is not None:
+        parser.error("--shuffle cannot be used with --sort-by")
+    if args.seed is not None and not args.shuffle:
+        parser.error("--seed requires --shuffle")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.jobs > 1 and "-" in args.input:
+        parser.error("--jobs cannot read from stdin")
+    if args.input_type != "ptmem":
+        for option, given in [
+            ("--check", args.check or args.max_errors > 0),
+            ("--with-source", args.with_source),
+            ("--jobs", args.jobs > 1),
+        ]:
+            if given:
+                parser.error(f"{option} requires ptmem input")
+    if args.depfile and "-" in paths:
+        parser.error("-MD cannot be used when writing to stdout")
 
-    # Read the file(s)
+    # Stdin and stdout cannot be stamped, but identical output files are
+    # still left alone
+    stamp = None
+    if args.no_clobber_identical and "-" not in args.input and "-" not in paths:
+        stamp = stamp_path(args.output)
+        if is_current(stamp, argv):
+            return
+    includes = Includes() if stamp is not None or args.depfile else None
 
-    lines = []
-    if len(args.input) == 1 and args.input[0] == "-":
-        lines = sys.stdin.readlines()
+    # Parse the file(s) in a single streaming pass, reporting diagnostics as
+    # they are found and handing each card to the writers as soon as it is
+    # complete. Every output is fed from this one parse.
+    diagnostics = 0
+
+    def report(diagnostic):
+        nonlocal diagnostics
+        diagnostics += 1
+        print(diagnostic, file=sys.stderr)
+        if args.max_errors and diagnostics >= args.max_errors:
+            parser.exit(1, f"ptmem: stopping after {diagnostics} diagnostic(s)\n")
+
+    check = args.check or args.max_errors > 0
+    source_map = SourceMap() if args.with_source else None
+    if args.jobs > 1:
+        threads = args.workers == "thread" or (
+            args.workers == "auto" and not gil_enabled()
+        )
+        cards = parse_parallel(
+            args.input,
+            args.jobs,
+            on_diagnostic=report if check else None,
+            source_map=source_map,
+            threads=threads,
+            includes=includes,
+        )
+    elif args.input_type == "ptmem":
+        cards = parse_cards(
+            iter_input_lines(args.input),
+            on_diagnostic=report if check else None,
+            source_map=source_map,
+            includes=includes,
+        )
     else:
-        for input_file in args.input:
-            with open(input_file, "r") as f:
-                file_lines = f.readlines()
-                lines.extend(file_lines)
-
-    # Parse the file
-    cards = []
-    card = {"questions": [], "answers": [], "category": None}
-    category = None
-    for line in lines:
-        line = line.strip()
-        if line.startswith("- "):
-            card["questions"].append(line[2:])
-        elif line.startswith("+ "):
-            card["answers"].append(line[2:])
-        elif line.startswith("# "):
-            category = line[2:]
-        elif line.startswith("/ "):
-            continue
-        elif line == "" and len(card["questions"]) > 0:
-            card["category"] = category
-            cards.append(card)
-            card = {"questions": [], "answers": [], "category": None}
-
-    if len(card["questions"]) > 0:
-        card["category"] = category
-        cards.append(card)
-
-    # Write the output file
-    if args.output_type == "json":
-        with open(args.output, "w") as f:
-            json.dump(cards, f, indent=4)
-    elif args.output_type == "fla.sh":
-        # Create new fla.sh format lines
-        new_lines = []
-        for card in cards:
-            line = f"{card['category'].replace(':', '—')}:{'; '.join(card['questions']).replace(':', '—')}:{'; '.join(card['answers']).replace(':', '—')}:0"
-            new_lines.append(line)
-
-        # If output file exists, preserve confidence scores for matching cards
-        if os.path.exists(args.output) and os.path.isfile(args.output):
-            with open(args.output, "r") as f:
-                existing_lines = [line.strip() for line in f.readlines()]
-
-            # Parse existing lines to extract card content (without confidence)
-            existing_cards = {}
-            for line in existing_lines:
-                if line.strip():
-                    parts = line.split(":")
-                    if len(parts) >= 4:
-                        card_content = ":".join(
-                            parts[:-1]
-                        )  # Everything except confidence
-                        confidence = parts[-1]
-                        existing_cards[card_content] = confidence
-
-            # Update new lines with existing confidence scores where cards match
-            final_lines = []
-            for new_line in new_lines:
-                card_content = ":".join(
-                    new_line.split(":")[:-1]
-                )  # Everything except confidence
-                if card_content in existing_cards:
-                    # Keep existing confidence
-                    final_lines.append(f"{card_content}:{existing_cards[card_content]}")
+        load = LOADERS[args.input_type]
+        cards = itertools.chain.from_iterable(map(load, args.input))
+    if args.category is not None:
+        cards = filter_category(cards, args.category, args.category_separator)
+    if source_map is not None:
+        cards = with_source(cards, source_map)
+
+    try:
+        with contextlib.ExitStack() as stack:
+            history = load_confidences(args.history) if args.history else None
+            writers = [
+                stack.enter_context(open_writer(output_type, path, args, history))
+                for output_type, path in outputs
+            ]
+            if (
+                outputs == [("fla.sh", args.output)]
+                and args.input_type == "ptmem"
+                and args.jobs == 1
+                and codecs.lookup(locale.getpreferredencoding(False)).name == "utf-8"
+                and not check
+                and source_map is None
+                and args.sort_by is None
+                and not args.history
+                and args.fuzzy_confidence is None
+                and args.category is None
+                and not args.shuffle
+                and writers[0].existing_cards.version == 1
+            ):
+                # Only the fla.sh content of each card is needed, so parse and
+                # write bytes without decoding the input or building cards
+                writers[0].write_contents(iter_contents(args.input, includes))
+                cards = ()
+            elif args.sort_by is not None:
+                if args.sort_by == "confidence":
+                    flash = next(w for w in writers if isinstance(w, FlashWriter))
+                    key = confidence_key(flash)
                 else:
-                    # New card, use default confidence of 0
-                    final_lines.append(new_line)
-
-            with open(args.output, "w") as f:
-                for line in final_lines:
-                    print(line, file=f)
-        else:
-            # File doesn't exist, create new with default confidence
-            with open(args.output, "w") as f:
-                for line in new_lines:
-                    print(line, file=f)
+                    key = SORT_KEYS[args.sort_by]
+                cards = external_sort(cards, key, run_size=args.sort_run_size)
+            elif args.shuffle:
+                cards = external_shuffle(cards, args.seed, run_size=args.sort_run_size)
+
+            for card in cards:
+                for writer in writers:
+                    writer.write(card)
+    except IncludeError as e:
+        parser.exit(1, f"ptmem: {e}\n")
+
+    if diagnostics:
+        sys.exit(1)
+    logs = [args.history] if args.history else []
+    if args.depfile:
+        inputs = [path for path in args.input if path != "-"]
+        fragments = [relative_to_cwd(path) for path in includes.paths]
+        write_depfile(args.depfile, paths, [*inputs, *fragments, *logs], fragments)
+    if stamp is not None:
+        depfile = [args.depfile] if args.depfile else []
+        write_stamp(
+            stamp, argv, [*args.input, *includes.paths, *logs, *paths, *depfile]
+        )
+
+
+def relative_to_cwd(path):
+    """Return ``path`` relative to the working directory if it is inside it,
+    as build tools usually name their files."""
+    cwd = os.getcwd()
+    try:
+        if os.path.commonpath([cwd, path]) == cwd:
+            return os.path.relpath(path, cwd)
+    except ValueError:  # On another drive
+        pass
+    return path
+
+
+def with_source(cards, source_map):
+    """Add a ``source`` object with the file and line recorded in
+    ``source_map`` to each card."""
+    for card in cards:
+        filename, lineno = source_map.last()
+        yield {**card, "source": {"file": filename, "line": lineno}}
+
+
+def open_writer(output_type, path, args, history=None):
+    """Create the writer for ``output_type`` with the options from ``args``."""
+    keep_identical = args.no_clobber_identical
+    if issubclass(WRITERS[output_type], FlashWriter):
+        return WRITERS[output_type](
+            path,
+            history=history,
+            keep_identical=keep_identical,
+            fuzzy_threshold=args.fuzzy_confidence,
+        )
+    if output_type in ("csv", "tsv"):
+        return WRITERS[output_type](
+            path,
+            question_joiner=args.question_joiner,
+            answer_joiner=args.answer_joiner,
+            keep_identical=keep_identical,
+        )
+    return WRITERS[output_type](path, keep_identical=keep_identical)
+
+
+def index_command(argv):
+    parser = argparse.ArgumentParser(
+        prog="ptmem index",
+        description="Build a full-text search index over PTMem cards",
+    )
+    parser.add_argument("input", nargs="+", help="Input file(s)")
+    parser.add_argument("index", help="Index file to write")
+    args = parser.parse_args(argv)
+
+    source_map = SourceMap()
+    cards = parse_cards(iter_input_lines(args.input), source_map=source_map)
+    try:
+        count = build_index(cards, args.index, source_map=source_map)
+    except IncludeError as e:
+        parser.exit(1, f"ptmem: {e}\n")
+    print(f"Indexed {count} cards", file=sys.stderr)
+
+
+def search_command(argv):
+    parser = argparse.ArgumentParser(
+        prog="ptmem search",
+        description="Search the questions and answers in a ptmem index. Cards "
+        "must contain every word of the query; a trailing * matches a prefix.",
+    )
+    parser.add_argument("index", help="Index file built by ptmem index")
+    parser.add_argument("query", nargs="+", help="Words to search for")
+    parser.add_argument(
+        "-n", "--limit", type=int, default=None, help="Show at most N cards"
+    )
+    args = parser.parse_args(argv)
+
+    with SearchIndex(args.index) as index:
+        card_ids = index.search(" ".join(args.query))
+        for card_id in card_ids[: args.limit]:
+            card = index.card(card_id)
+            source = card["source"]
+            print(
+                f"{source['file']}:{source['line']}: "
+                f"{'; '.join(card['questions'])} -> {'; '.join(card['answers'])}"
+            )
+
+    if not card_ids:
+        sys.exit(1)
+
+
+def similar_command(argv):
+    parser = argparse.ArgumentParser(
+        prog="ptmem similar",
+        description="Report clusters of near-duplicate cards",
+    )
+    parser.add_argument("input", nargs="+", help="Input file(s)")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.7,
+        help="Minimum estimated similarity, between 0 and 1 (default: 0.7)",
+    )
+    args = parser.parse_args(argv)
+    if not 0 < args.threshold <= 1:
+        parser.error("--threshold must be greater than 0 and at most 1")
+
+    source_map = SourceMap()
+    questions = []
+
+    def cards():
+        for card in parse_cards(iter_input_lines(args.input), source_map=source_map):
+            questions.append("; ".join(card["questions"]))
+            yield card
+
+    try:
+        clusters = find_similar(cards(), threshold=args.threshold)
+    except IncludeError as e:
+        parser.exit(1, f"ptmem: {e}\n")
+    locations = list(source_map)
+    for n, cluster in enumerate(clusters):
+        if n:
+            print()
+        for card_id in cluster:
+            filename, lineno = locations[card_id]
+            print(f"{filename}:{lineno}: {questions[card_id]}")
+
+
+def categories_command(argv):
+    parser = argparse.ArgumentParser(
+        prog="ptmem categories",
+        description="Show the category tree of a deck with the number of cards "
+        "under each category and the IDs of the cards in it",
+    )
+    parser.add_argument("input", nargs="+", help="Input file(s)")
+    parser.add_argument(
+        "--separator",
+        default=SEPARATOR,
+        help=f"Separator of nested category names (default: {SEPARATOR})",
+    )
+    args = parser.parse_args(argv)
+
+    trie = CategoryTrie(args.separator)
+    try:
+        for _ in trie.index(parse_cards(iter_input_lines(args.input))):
+            pass
+    except IncludeError as e:
+        parser.exit(1, f"ptmem: {e}\n")
+
+    def ids(node):
+        return ",".join(
+            str(start) if end == start + 1 else f"{start}-{end - 1}"
+            for start, end in node.ranges
+        )
+
+    if trie.root.count:
+        print(f"(none)\t{trie.root.count}\t{ids(trie.root)}")
+
+    def show(node, depth):
+        for child in node.children.values():
+            print(f"{'  ' * depth}{child.name}\t{child.total}\t{ids(child)}".rstrip())
+            show(child, depth + 1)
+
+    show(trie.root, 0)
+
+
+def sample_command(argv):
+    parser = argparse.ArgumentParser(
+        prog="ptmem sample",
+        description="Write N cards picked uniformly at random, reading the deck "
+        "once and keeping only the picked cards in memory",
+    )
+    parser.add_argument("input", nargs="+", help="Input file(s)")
+    parser.add_argument("output", help="Output file, or - for stdout")
+    parser.add_argument(
+        "-n", "--count", type=int, required=True, metavar="N", help="Cards to pick"
+    )
+    parser.add_argument("--seed", type=int, help="Random seed, to repeat a sample")
+    parser.add_argument(
+        "--shuffle",
+        action="store_true",
+        help="Write the picked cards in a random order instead of deck order",
+    )
+    parser.add_argument(
+        "-i",
+        "--input-type",
+        choices=["ptmem", *LOADERS],
+        default="ptmem",
+        help="Type of the input files (default: ptmem)",
+    )
+    parser.add_argument(
+        "-t",
+        "--output-type",
+        choices=list(WRITERS),
+        default="json",
+        help="Output type (default: json)",
+    )
+    args = parser.parse_args(argv)
+    if args.count < 0:
+        parser.error("--count must not be negative")
+
+    if args.input_type == "ptmem":
+        cards = parse_cards(iter_input_lines(args.input))
+    else:
+        load = LOADERS[args.input_type]
+        cards = itertools.chain.from_iterable(map(load, args.input))
+    try:
+        picked = reservoir_sample(cards, args.count, seed=args.seed)
+    except IncludeError as e:
+        parser.exit(1, f"ptmem: {e}\n")
+    if args.shuffle:
+        # A generator of its own, so that --shuffle does not change which
+        # cards are picked
+        random.Random(args.seed).shuffle(picked)
+
+    with WRITERS[args.output_type](args.output) as writer:
+        for card in picked:
+            writer.write(card)
+
+
+def diff_command(argv):
+    parser = argparse.ArgumentParser(
+        prog="ptmem diff",
+        description="Show cards added, removed and modified between two decks, "
+        "and confidence changes between two fla.sh files. Exits with status 1 "
+        "if the decks differ.",
+    )
+    parser.add_argument("old", help="Old deck")
+    parser.add_argument("new", help="New deck")
+    parser.add_argument(
+        "-t",
+        "--input-type",
+        choices=["ptmem", *LOADERS],
+        default="ptmem",
+        help="Type of both decks (default: ptmem)",
+    )
+    args = parser.parse_args(argv)
+
+    def describe(card):
+        return f"[{card['category'] or ''}] {'; '.join(card['questions'])}"
+
+    changes = 0
+    try:
+        for change in diff_entries(
+            iter_entries(args.old, args.input_type),
+            iter_entries(args.new, args.input_type),
+        ):
+            changes += 1
+            old, new = change.old, change.new
+            if change.kind == "added":
+                answers = "; ".join(new.card["answers"])
+                print(f"+ {new.location}: {describe(new.card)} -> {answers}")
+            elif change.kind == "removed":
+                answers = "; ".join(old.card["answers"])
+                print(f"- {old.location}: {describe(old.card)} -> {answers}")
+            elif change.kind == "modified":
+                old_answers = "; ".join(old.card["answers"])
+                new_answers = "; ".join(new.card["answers"])
+                print(
+                    f"~ {new.location}: {describe(new.card)} -> {old_answers} "
+                    f"=> {new_answers}"
+                )
+            else:
+                print(
+                    f"c {new.location}: {describe(new.card)}: confidence "
+                    f"{old.confidence} => {new.confidence}"
+                )
+    except IncludeError as e:
+        parser.exit(1, f"ptmem: {e}\n")
+
+    if changes:
+        sys.exit(1)
+
+
+def compact_command(argv):
+    parser = argparse.ArgumentParser(
+        prog="ptmem compact",
+        description="Compact a review log, keeping only the latest reviews of "
+        "each card",
+    )
+    parser.add_argument("log", help="Review log to compact in place")
+    parser.add_argument(
+        "--keep",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Reviews to keep per card (default: 1)",
+    )
+    args = parser.parse_args(argv)
+    if args.keep < 1:
+        parser.error("--keep must be at least 1")
+
+    kept = compact(args.log, keep=args.keep)
+    print(f"Kept {kept} reviews", file=sys.stderr)
+
+
+COMMANDS = {
+    "categories": categories_command,
+    "compact": compact_command,
+    "diff": diff_command,
+    "index": index_command,
+    "sample": sample_command,
+    "search": search_command,
+    "similar": similar_command,
+}
 
 
 if __name__ == "__main__":
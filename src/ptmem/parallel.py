@@ -0,0 +1,304 @@
+import gc
+import io
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple
+
+from .compress import detect_compression, open_input
+from .flash import _strip_line
+from .parser import (
+    Diagnostic,
+    IncludeError,
+    Includes,
+    SourceMap,
+    iter_input_lines,
+    parse_cards,
+)
+
+# Largest amount of input handed to one worker
+CHUNK_SIZE = 32 * 1024 * 1024
+
+
+def gil_enabled():
+    """Return whether the GIL is enabled, which is always the case on builds
+    without free threading."""
+    return getattr(sys, "_is_gil_enabled", lambda: True)()
+
+
+class Segment(NamedTuple):
+    """Byte range ``[start, end)`` of input number ``index``. ``end`` is
+    ``None`` for a compressed file, which is always read whole."""
+
+    index: int
+    path: str
+    start: int
+    end: int
+
+
+class ChunkResult(NamedTuple):
+    """What a worker found in one chunk of the input.
+
+    Locations are ``(segment, filename, lineno)``, where ``segment`` is the
+    position in the chunk of the segment the line was read from and
+    ``lineno`` is relative to the start of that segment, or ``segment`` is
+    ``None`` for lines of included fragments. ``leading`` is the number of
+    cards completed before the chunk's first category line, whose category
+    comes from the chunks before it, and ``category`` is the last category
+    set in the chunk, or ``None``. ``lines`` is the number of lines in each
+    segment, ``fragments`` the paths of the fragments the chunk included,
+    and ``error`` is ``(location, message)`` if an include failed.
+    """
+
+    cards: list
+    locations: list
+    diagnostics: list
+    leading: int
+    category: str
+    lines: list
+    fragments: list
+    error: tuple
+
+
+def split_chunks(paths, jobs, chunk_size=None):
+    """Split the files at ``paths`` into chunks of about ``chunk_size``
+    bytes at most, and at least ``jobs`` chunks for enough input.
+
+    Each chunk is a list of :class:`Segment`; a chunk can span several small
+    files. Chunks only end just after a blank line that completes a card, or
+    at the end of the input, so no parse state other than the current
+    category carries over from one chunk to the next. Compressed files
+    cannot be split.
+    """
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    sizes = [os.path.getsize(path) for path in paths]
+    step = max(1, min(chunk_size, -(-sum(sizes) // jobs)))
+    chunks = []
+    chunk = []
+    room = step
+    for index, (path, size) in enumerate(zip(paths, sizes)):
+        if detect_compression(path) is not None:
+            chunk.append(Segment(index, path, 0, None))
+            room -= size
+            continue
+        with open(path, "rb") as f:
+            start = 0
+            while start < size:
+                end = size
+                if room < size - start:
+                    f.seek(start + max(room, 0))
+                    end = _next_boundary(f)
+                chunk.append(Segment(index, path, start, end))
+                room -= end - start
+                if end < size:
+                    chunks.append(chunk)
+                    chunk = []
+                    room = step
+                start = end
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _next_boundary(f):
+    # Skip to the end of the current line, then find a blank line ending a
+    # paragraph with a question after any include line. The parser always
+    # completes a card on such a line, while a blank line after answers alone
+    # would carry them over to the next card. Lines are stripped like the
+    # parser strips them, so Unicode whitespace lines count as blank.
+    f.readline()
+    question = False
+    while line := f.readline():
+        line = _strip_line(line)
+        if line.startswith(b"- "):
+            question = True
+        elif line.startswith(b"@ "):
+            question = False
+        elif not line and question:
+            return f.tell()
+    return f.tell()
+
+
+class _SegmentName(str):
+    # A distinct object per segment, so lines read from the chunk can be told
+    # apart from lines of included fragments, even of the same file
+    __slots__ = ()
+
+
+def parse_chunk(chunk, with_source=False, check=False, pause_gc=False):
+    """Parse a chunk from :func:`split_chunks` and return a
+    :class:`ChunkResult`.
+
+    This runs in a worker and shares no state with other workers. With
+    ``pause_gc``, the cyclic garbage collector is paused while the chunk's
+    cards are collected; the setting is global to the interpreter, so only a
+    worker process may do this.
+    """
+    names = [_SegmentName(segment.path) for segment in chunk]
+    segment_of = {id(name): n for n, name in enumerate(names)}
+    lines_read = [0] * len(chunk)
+    category = None
+    current = (None, 0)
+
+    def read(segment):
+        if segment.end is None:
+            return open_input(segment.path)
+        with open(segment.path, "rb") as f:
+            f.seek(segment.start)
+            data = f.read(segment.end - segment.start)
+        # Decode like open() would, with universal newlines
+        return io.TextIOWrapper(io.BytesIO(data))
+
+    def lines():
+        nonlocal category, current
+        for n, (segment, name) in enumerate(zip(chunk, names)):
+            with read(segment) as f:
+                for lineno, line in enumerate(f, 1):
+                    stripped = line.strip()
+                    if stripped.startswith("# "):
+                        category = stripped[2:]
+                    current = (name, lineno)
+                    lines_read[n] = lineno
+                    yield name, lineno, line
+
+    def locate(filename, lineno):
+        return (segment_of.get(id(filename)), str(filename), lineno)
+
+    source_map = SourceMap() if with_source else None
+    includes = Includes()
+    diagnostics = []
+    cards = []
+    leading = 0
+    error = None
+    # Every card of the chunk is kept until it is returned. Cards contain no
+    # reference cycles, so the cyclic garbage collector can be paused rather
+    # than left to rescan the growing list over and over.
+    pause_gc = pause_gc and gc.isenabled()
+    if pause_gc:
+        gc.disable()
+    try:
+        for card in parse_cards(
+            lines(),
+            on_diagnostic=diagnostics.append if check else None,
+            source_map=source_map,
+            includes=includes,
+        ):
+            if category is None:
+                leading += 1
+            cards.append(card)
+    except IncludeError as e:
+        name, lineno = current
+        error = (locate(name, lineno), str(e).removeprefix(f"{name}:{lineno}: "))
+    finally:
+        if pause_gc:
+            gc.enable()
+    return ChunkResult(
+        cards,
+        [locate(*location) for location in source_map] if with_source else None,
+        [(locate(*d[:2]), d.message) for d in diagnostics],
+        leading,
+        category,
+        lines_read,
+        includes.paths,
+        error,
+    )
+
+
+def parse_parallel(
+    paths,
+    jobs,
+    on_diagnostic=None,
+    source_map=None,
+    chunk_size=None,
+    threads=False,
+    includes=None,
+):
+    """Parse the files at ``paths`` with ``jobs`` workers.
+
+    Yields the same cards, records the same source locations and reports the
+    same diagnostics in the same order as :func:`~ptmem.parser.parse_cards`
+    over all the files. The input is split with :func:`split_chunks`; each
+    chunk is parsed independently and the results are fixed up in order, so
+    cards before a chunk's first category line get the category in effect at
+    the end of the previous chunk.
+
+    Workers are processes, or with ``threads`` threads of this process.
+    Threads can only parse in parallel on a free-threaded build; under the
+    GIL the files are parsed sequentially instead.
+
+    If ``includes`` is given, every fragment the workers included is also
+    recorded in it, without being parsed again, so its :attr:`~ptmem.parser.Includes.paths` are those of
+    a sequential parse.
+    """
+    if threads and gil_enabled():
+        yield from parse_cards(
+            iter_input_lines(paths),
+            on_diagnostic=on_diagnostic,
+            source_map=source_map,
+            includes=includes,
+        )
+        return
+
+    executor = ThreadPoolExecutor(jobs) if threads else ProcessPoolExecutor(jobs)
+    category = None
+    # Lines merged so far from each input
+    offsets = [0] * len(paths)
+    # Diagnostics in included fragments, which every worker that includes a
+    # fragment reports but a sequential parse reports only once
+    seen = set()
+
+    def merge(chunk, result):
+        nonlocal category
+
+        def locate(segment, filename, lineno):
+            if segment is None:
+                return filename, lineno
+            return filename, lineno + offsets[chunk[segment].index]
+
+        if on_diagnostic is not None:
+            for location, message in result.diagnostics:
+                diagnostic = Diagnostic(*locate(*location), message)
+                if location[0] is None:
+                    if diagnostic in seen:
+                        continue
+                    seen.add(diagnostic)
+                on_diagnostic(diagnostic)
+        for n, card in enumerate(result.cards):
+            if n < result.leading and card["category"] is None:
+                card["category"] = category
+            if source_map is not None:
+                source_map.add(*locate(*result.locations[n]))
+            yield card
+        if result.error is not None:
+            location, message = result.error
+            raise IncludeError("{}:{}: {}".format(*locate(*location), message))
+        if result.category is not None:
+            category = result.category
+        for segment, lines in zip(chunk, result.lines):
+            offsets[segment.index] += lines
+        if includes is not None:
+            for path in result.fragments:
+                includes.add_path(path)
+
+    try:
+        futures = deque()
+        for chunk in split_chunks(paths, jobs, chunk_size):
+            future = executor.submit(
+                parse_chunk,
+                chunk,
+                source_map is not None,
+                on_diagnostic is not None,
+                not threads,
+            )
+            futures.append((chunk, future))
+            # Keep a bounded number of parsed chunks waiting to be merged
+            if len(futures) >= 2 * jobs:
+                chunk, future = futures.popleft()
+                yield from merge(chunk, future.result())
+        while futures:
+            chunk, future = futures.popleft()
+            yield from merge(chunk, future.result())
+    finally:
+        executor.shutdown(cancel_futures=True)
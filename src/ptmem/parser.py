@@ -0,0 +1,303 @@
+import codecs
+import io
+import os
+import sys
+from array import array
+from collections import deque
+from typing import NamedTuple
+
+from .compress import open_input
+
+
+class Diagnostic(NamedTuple):
+    """A problem found in a PTMem source, reported as ``file:line: message``."""
+
+    filename: str
+    lineno: int
+    message: str
+
+    def __str__(self):
+        return f"{self.filename}:{self.lineno}: {self.message}"
+
+
+class SourceMap:
+    """Starting line of each parsed card, kept alongside the card list.
+
+    Line numbers are stored in one ``array('I')`` per run of consecutive cards
+    from the same file, so the cost is four bytes per card.
+    """
+
+    def __init__(self):
+        self.files = []
+        self.lines = []
+
+    def add(self, filename, lineno):
+        if not self.files or self.files[-1] != filename:
+            self.files.append(filename)
+            self.lines.append(array("I"))
+        self.lines[-1].append(lineno)
+
+    def last(self):
+        """Return ``(filename, lineno)`` of the most recently added card."""
+        return self.files[-1], self.lines[-1][-1]
+
+    def __len__(self):
+        return sum(len(lines) for lines in self.lines)
+
+    def __iter__(self):
+        """Yield ``(filename, lineno)`` for each card, in card order."""
+        for filename, lines in zip(self.files, self.lines):
+            for lineno in lines:
+                yield filename, lineno
+
+
+def iter_input_lines(inputs):
+    """Yield ``(filename, lineno, line)`` for every line of the input files.
+
+    Files are read lazily, one line at a time, so nothing is buffered beyond
+    the line being parsed. Compressed files are decompressed on the fly. A
+    single ``-`` input reads from stdin.
+    """
+    if len(inputs) == 1 and inputs[0] == "-":
+        for lineno, line in enumerate(sys.stdin, 1):
+            yield "<stdin>", lineno, line
+        return
+
+    for input_file in inputs:
+        with open_input(input_file) as f:
+            for lineno, line in enumerate(f, 1):
+                yield input_file, lineno, line
+
+
+class IncludeError(ValueError):
+    """Raised when ``@`` include lines form a cycle or name a file that cannot
+    be read."""
+
+
+class Includes:
+    """Fragments pulled in by ``@`` include lines during one run.
+
+    Each fragment is parsed once and its cards are memoized, so a fragment
+    included from many decks is only read a single time.
+    """
+
+    def __init__(self):
+        self.cache = {}
+        self.active = []
+        # Every included path in the order it was finished, as a set that
+        # keeps insertion order
+        self.seen = {}
+
+    @property
+    def paths(self):
+        """Paths of every fragment included so far."""
+        return list(self.seen)
+
+    def add_path(self, path):
+        """Record ``path`` as included without parsing it, for fragments that
+        were parsed elsewhere, such as in a worker."""
+        self.seen[os.path.realpath(path)] = None
+
+    def load(self, path, on_diagnostic=None):
+        """Return ``(cards, source_map)`` for the fragment at ``path``."""
+        key = os.path.realpath(path)
+        if key in self.active:
+            chain = self.active[self.active.index(key) :] + [key]
+            raise IncludeError(f"include cycle: {' -> '.join(chain)}")
+        if key not in self.cache:
+            self.active.append(key)
+            try:
+                source_map = SourceMap()
+                cards = list(
+                    parse_cards(
+                        iter_input_lines([path]),
+                        on_diagnostic=on_diagnostic,
+                        source_map=source_map,
+                        includes=self,
+                    )
+                )
+            finally:
+                self.active.pop()
+            self.cache[key] = (cards, source_map)
+            self.seen[key] = None
+        return self.cache[key]
+
+
+# Pulled by parse_cards when a PtmemParser is waiting for more input
+_WAIT = (None, 0, "")
+
+
+class PtmemParser:
+    """Incremental PTMem parser that is pushed text instead of pulling lines.
+
+    :meth:`feed` accepts chunks of text (or UTF-8 bytes) of any size, split
+    anywhere, and returns the cards they complete; :meth:`close` returns the
+    last card once the input has ended. The parse state lives in a suspended
+    :func:`parse_cards` generator that is resumed whenever whole lines arrive,
+    and only the unfinished line at the end of a chunk is held back until the
+    rest of it arrives. As in text mode files, ``\n``, ``\r\n`` and a lone
+    ``\r`` all end a line, even when a ``\r\n`` is split across two chunks.
+
+    ``filename`` is used in diagnostics and source locations and to resolve
+    ``@`` include lines. The other arguments are as for :func:`parse_cards`.
+    """
+
+    def __init__(
+        self, filename="<stream>", on_diagnostic=None, source_map=None, includes=None
+    ):
+        self.filename = filename
+        self.lineno = 0
+        self.lines = deque()
+        self.partial = []
+        self.decoder = None
+        self.end = ""
+        self.closed = False
+        self.cards = parse_cards(
+            self._pending_lines(),
+            on_diagnostic=on_diagnostic,
+            source_map=source_map,
+            includes=includes,
+        )
+
+    def feed(self, data):
+        """Parse a chunk of the input and return the cards it completes."""
+        if self.closed:
+            raise ValueError("feed() after close()")
+        if self.decoder is None:
+            self.decoder = io.IncrementalNewlineDecoder(
+                codecs.getincrementaldecoder("utf-8")()
+                if isinstance(data, bytes)
+                else None,
+                translate=True,
+            )
+            self.end = data[:0]
+        data = self.decoder.decode(data)
+        start = 0
+        while (end := data.find("\n", start)) != -1:
+            line = data[start : end + 1]
+            if self.partial:
+                self.partial.append(line)
+                line = "".join(self.partial)
+                self.partial.clear()
+            self._push(line)
+            start = end + 1
+        if start < len(data):
+            self.partial.append(data[start:])
+        return self._completed()
+
+    def close(self):
+        """Finish parsing and return the cards completed by the end of the
+        input."""
+        if self.decoder is not None:
+            self.partial.append(self.decoder.decode(self.end, final=True))
+        if any(self.partial):
+            self._push("".join(self.partial))
+            self.partial.clear()
+        self.closed = True
+        return self._completed()
+
+    def _push(self, line):
+        self.lineno += 1
+        self.lines.append((self.filename, self.lineno, line))
+
+    def _pending_lines(self):
+        while True:
+            if self.lines:
+                yield self.lines.popleft()
+            elif self.closed:
+                return
+            else:
+                yield _WAIT
+
+    def _completed(self):
+        completed = []
+        for card in self.cards:
+            if card is None:
+                break
+            completed.append(card)
+        return completed
+
+
+def parse_cards(lines, on_diagnostic=None, source_map=None, includes=None):
+    """Parse ``(filename, lineno, line)`` triples into card dicts.
+
+    Cards are yielded as soon as they are complete. If ``on_diagnostic`` is
+    given, it is called with a :class:`Diagnostic` for every construct the
+    parser accepts but would otherwise handle silently. If ``source_map`` is
+    given, the line of each card's first question is recorded in it.
+
+    An ``@ path`` line ends the current card and inserts the cards of the
+    fragment at ``path``, relative to the including file. Fragment cards
+    without a category of their own get the including file's current
+    category. Pass an :class:`Includes` to share parsed fragments between
+    calls.
+    """
+    if includes is None:
+        includes = Includes()
+    card = {"questions": [], "answers": [], "category": None}
+    category = None
+    start = None
+
+    def finish():
+        card["category"] = category
+        if on_diagnostic is not None and not card["answers"]:
+            on_diagnostic(Diagnostic(*start, "question without an answer"))
+        if source_map is not None:
+            source_map.add(*start)
+        return card
+
+    for filename, lineno, line in lines:
+        if filename is None:
+            # A PtmemParser has no more input yet
+            yield None
+            continue
+        line = line.strip()
+        if line.startswith("- "):
+            if not card["questions"]:
+                start = (filename, lineno)
+            card["questions"].append(line[2:])
+        elif line.startswith("+ "):
+            if on_diagnostic is not None and not card["questions"]:
+                on_diagnostic(
+                    Diagnostic(
+                        filename,
+                        lineno,
+                        "answer without a question (attached to the next card)",
+                    )
+                )
+            card["answers"].append(line[2:])
+        elif line.startswith("# "):
+            category = line[2:]
+        elif line.startswith("/ "):
+            continue
+        elif line == "":
+            if len(card["questions"]) > 0:
+                yield finish()
+                card = {"questions": [], "answers": [], "category": None}
+        elif line.startswith("@ "):
+            if len(card["questions"]) > 0:
+                yield finish()
+                card = {"questions": [], "answers": [], "category": None}
+            path = line[2:].strip()
+            if filename != "<stdin>":
+                path = os.path.join(os.path.dirname(filename), path)
+            try:
+                fragment_cards, fragment_map = includes.load(path, on_diagnostic)
+            except IncludeError as e:
+                raise IncludeError(f"{filename}:{lineno}: {e}") from None
+            except OSError as e:
+                raise IncludeError(
+                    f"{filename}:{lineno}: cannot include {path}: {e.strerror or e}"
+                ) from None
+            for fragment_card, location in zip(fragment_cards, fragment_map):
+                if source_map is not None:
+                    source_map.add(*location)
+                if fragment_card["category"] is None:
+                    yield {**fragment_card, "category": category}
+                else:
+                    yield dict(fragment_card)
+        elif on_diagnostic is not None:
+            on_diagnostic(Diagnostic(filename, lineno, f"unrecognized line: {line!r}"))
+
+    if len(card["questions"]) > 0:
+        yield finish()
@@ -0,0 +1,105 @@
+import collections
+import itertools
+import json
+import math
+import os
+import random
+import tempfile
+
+from .sort import RUN_SIZE
+
+# Number of bucket files a shuffle spills cards into at each level
+BUCKETS = 64
+
+
+def _unit(rng):
+    # A uniform float in (0, 1), which can be passed to math.log
+    while True:
+        u = rng.random()
+        if u:
+            return u
+
+
+def reservoir_sample(cards, n, seed=None):
+    """Return ``n`` cards chosen uniformly at random from ``cards``, in the
+    order they came in, or all of them if there are fewer.
+
+    ``cards`` is consumed one at a time and only the ``n`` chosen cards are
+    kept. This is Li's Algorithm L, which computes how many cards to skip
+    before the next replacement instead of drawing a random number for every
+    card. The same ``seed`` picks the same cards from the same deck.
+    """
+    rng = random.Random(seed)
+    cards = enumerate(cards)
+    reservoir = list(itertools.islice(cards, n))
+    if len(reservoir) == n and n > 0:
+        w = math.exp(math.log(_unit(rng)) / n)
+        # With a huge reservoir, w can round to 1: no card would replace one
+        # in it any more
+        while w < 1.0:
+            skip = math.floor(math.log(_unit(rng)) / math.log1p(-w))
+            collections.deque(itertools.islice(cards, skip), maxlen=0)
+            record = next(cards, None)
+            if record is None:
+                break
+            reservoir[rng.randrange(n)] = record
+            w *= math.exp(math.log(_unit(rng)) / n)
+    reservoir.sort(key=lambda record: record[0])
+    return [card for _, card in reservoir]
+
+
+def external_shuffle(cards, seed=None, run_size=RUN_SIZE):
+    """Yield ``cards`` in a uniformly random order.
+
+    Up to ``run_size`` cards are shuffled in memory. If there are more, each
+    card is spilled as a JSON line to one of :data:`BUCKETS` temporary files
+    picked at random; the buckets are then shuffled one at a time and
+    concatenated, which again gives a uniform permutation. A bucket larger
+    than ``run_size`` is split the same way, so memory use is bounded by the
+    run size rather than by the deck. The same ``seed`` gives the same order
+    for the same deck.
+    """
+    rng = random.Random(seed)
+    cards = iter(cards)
+    run = list(itertools.islice(cards, run_size))
+    if len(run) < run_size:
+        rng.shuffle(run)
+        yield from run
+        return
+
+    lines = (
+        json.dumps(card, ensure_ascii=False) + "\n"
+        for card in itertools.chain(run, cards)
+    )
+    del run
+    with tempfile.TemporaryDirectory(prefix="ptmem-shuffle-") as tmpdir:
+        for line in _shuffle_lines(lines, rng, run_size, tmpdir):
+            yield json.loads(line)
+
+
+def _shuffle_lines(lines, rng, run_size, tmpdir):
+    buckets = []
+    try:
+        for n in range(BUCKETS):
+            path = os.path.join(tmpdir, f"bucket{n}.jsonl")
+            buckets.append(open(path, "w+", encoding="utf-8"))
+        counts = [0] * BUCKETS
+        for line in lines:
+            n = rng.randrange(BUCKETS)
+            buckets[n].write(line)
+            counts[n] += 1
+
+        for n, (f, count) in enumerate(zip(buckets, counts)):
+            f.seek(0)
+            if count <= run_size:
+                run = f.readlines()
+                rng.shuffle(run)
+                yield from run
+            else:
+                subdir = os.path.join(tmpdir, str(n))
+                os.mkdir(subdir)
+                yield from _shuffle_lines(f, rng, run_size, subdir)
+            f.close()
+    finally:
+        for f in buckets:
+            f.close()
@@ -0,0 +1,231 @@
+import bisect
+import itertools
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+
+from .compress import temp_path
+
+MAGIC = b"PTMEMIDX"
+VERSION = 1
+
+# magic, version, card count, term count, then the offset of each section
+HEADER = struct.Struct("<8sIIQQQQQQQ")
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split ``text`` into lowercase word tokens."""
+    return TOKEN_RE.findall(text.lower())
+
+
+def card_tokens(card):
+    """Return the set of tokens in a card's questions and answers."""
+    tokens = set()
+    for text in itertools.chain(card["questions"], card["answers"]):
+        tokens.update(tokenize(text))
+    return tokens
+
+
+def _read_array(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _array_bytes(values):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _encode_postings(card_ids):
+    """Delta-encode ascending card IDs into the narrowest array type that fits,
+    prefixed with its typecode."""
+    deltas = [card_ids[0]] + [b - a for a, b in zip(card_ids, card_ids[1:])]
+    largest = max(deltas)
+    typecode = "B" if largest < 1 << 8 else "H" if largest < 1 << 16 else "I"
+    return typecode.encode() + _array_bytes(array(typecode, deltas))
+
+
+def _decode_postings(data):
+    typecode = chr(data[0])
+    return list(itertools.accumulate(_read_array(typecode, data[1:])))
+
+
+def build_index(cards, path, source_map=None):
+    """Build a search index over ``cards`` and write it to ``path``.
+
+    Cards are consumed one at a time. If ``source_map`` is the map filled in
+    while parsing ``cards``, each stored card records where it came from.
+    Returns the number of cards indexed.
+    """
+    postings = {}
+    card_offsets = array("Q", [0])
+    card_data = bytearray()
+    for card_id, card in enumerate(cards):
+        for token in card_tokens(card):
+            postings.setdefault(token, array("I")).append(card_id)
+        if source_map is not None:
+            filename, lineno = source_map.last()
+            card = {**card, "source": {"file": filename, "line": lineno}}
+        card_data += json.dumps(card, ensure_ascii=False).encode()
+        card_offsets.append(len(card_data))
+
+    terms = sorted(postings)
+    term_offsets = array("Q", [0])
+    term_data = bytearray()
+    postings_offsets = array("Q", [0])
+    postings_data = bytearray()
+    for term in terms:
+        term_data += term.encode()
+        term_offsets.append(len(term_data))
+        postings_data += _encode_postings(postings[term])
+        postings_offsets.append(len(postings_data))
+
+    sections = [
+        _array_bytes(term_offsets),
+        bytes(term_data),
+        _array_bytes(postings_offsets),
+        bytes(postings_data),
+        _array_bytes(card_offsets),
+        bytes(card_data),
+    ]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+
+    tmp_path = temp_path(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(
+                HEADER.pack(MAGIC, VERSION, len(card_offsets) - 1, len(terms), *offsets)
+            )
+            for section in sections:
+                f.write(section)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return len(card_offsets) - 1
+
+
+class _Terms:
+    """Sequence view of the sorted term table, for use with :mod:`bisect`."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return self.index.term_count
+
+    def __getitem__(self, i):
+        return self.index.term(i)
+
+
+class SearchIndex:
+    """A search index written by :func:`build_index`, memory-mapped for
+    lookups without re-parsing the source decks."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = self.mm[: HEADER.size]
+        if len(header) < HEADER.size or not header.startswith(MAGIC):
+            self.mm.close()
+            raise ValueError(f"{path} is not a ptmem search index")
+        (
+            _,
+            version,
+            self.card_count,
+            self.term_count,
+            *self.sections,
+        ) = HEADER.unpack(header)
+        if version != VERSION:
+            self.mm.close()
+            raise ValueError(f"{path} has unsupported index version {version}")
+        self.term_offsets = self._offsets(0, self.term_count + 1)
+        self.postings_offsets = self._offsets(2, self.term_count + 1)
+        self.card_offsets = self._offsets(4, self.card_count + 1)
+        self.terms = _Terms(self)
+
+    def _offsets(self, section, count):
+        start = self.sections[section]
+        return _read_array("Q", self.mm[start : start + 8 * count])
+
+    def close(self):
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.card_count
+
+    def _record(self, section, offsets, i):
+        start = self.sections[section]
+        return self.mm[start + offsets[i] : start + offsets[i + 1]]
+
+    def term(self, i):
+        return self._record(1, self.term_offsets, i).decode()
+
+    def postings(self, i):
+        """Return the ascending card IDs for term number ``i``."""
+        return _decode_postings(self._record(3, self.postings_offsets, i))
+
+    def card(self, card_id):
+        """Return the stored card with ID ``card_id``."""
+        return json.loads(self._record(5, self.card_offsets, card_id))
+
+    def lookup(self, term):
+        """Return the set of card IDs containing ``term``.
+
+        A trailing ``*`` matches every term starting with the rest of it.
+        """
+        if term.endswith("*"):
+            prefix = term[:-1].lower()
+            matches = set()
+            i = bisect.bisect_left(self.terms, prefix)
+            while i < self.term_count and self.term(i).startswith(prefix):
+                matches.update(self.postings(i))
+                i += 1
+            return matches
+        term = term.lower()
+        i = bisect.bisect_left(self.terms, term)
+        if i < self.term_count and self.term(i) == term:
+            return set(self.postings(i))
+        return set()
+
+    def search(self, query):
+        """Return the ascending IDs of cards matching every word of ``query``."""
+        words = []
+        for word in query.split():
+            if word.endswith("*"):
+                *exact, prefix = tokenize(word[:-1]) or [""]
+                words.extend(exact)
+                words.append(prefix + "*")
+            else:
+                words.extend(tokenize(word))
+        if not words:
+            return []
+        results = sorted((self.lookup(word) for word in words), key=len)
+        matches = results[0]
+        for result in results[1:]:
+            if not matches:
+                break
+            matches = matches & result
+        return sorted(matches)
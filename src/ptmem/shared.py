@@ -0,0 +1,267 @@
+import json
+import struct
+from array import array
+from collections.abc import Mapping, Sequence
+from multiprocessing import shared_memory
+
+MAGIC = b"PTMEMSHM"
+VERSION = 1
+
+# String ID of a missing category or of a card without extra fields
+NONE = 0xFFFFFFFF
+
+# magic, version, card count, string count, then the offset of each section.
+# The deck never leaves the machine, so everything is in native byte order.
+HEADER = struct.Struct("=8sIIQQQQQQQQQ")
+
+# The card fields every card has; any others are stored as one JSON string
+FIELDS = ("questions", "answers", "category")
+
+
+def _align(position):
+    return -(-position // 8) * 8
+
+
+def publish(cards, name=None):
+    """Lay ``cards`` out in a new shared memory block and return the
+    :class:`SharedDeck` that owns it.
+
+    Cards are consumed one at a time and only their strings are kept while
+    the layout is built; each distinct string is stored once. Fields other
+    than questions, answers and category (such as ``confidence`` or
+    ``source``) are kept as JSON. Other processes can then
+    :meth:`SharedDeck.attach` to the block by its name.
+    """
+    strings = {}
+    pool = bytearray()
+    string_starts = array("Q", [0])
+
+    def intern(text):
+        string_id = strings.get(text)
+        if string_id is None:
+            string_id = strings[text] = len(string_starts) - 1
+            pool.extend(text.encode())
+            string_starts.append(len(pool))
+        return string_id
+
+    categories = array("I")
+    extras = array("I")
+    question_starts = array("I", [0])
+    questions = array("I")
+    answer_starts = array("I", [0])
+    answers = array("I")
+    for card in cards:
+        questions.extend(map(intern, card["questions"]))
+        question_starts.append(len(questions))
+        answers.extend(map(intern, card["answers"]))
+        answer_starts.append(len(answers))
+        category = card["category"]
+        categories.append(NONE if category is None else intern(category))
+        extra = {key: value for key, value in card.items() if key not in FIELDS}
+        extras.append(intern(json.dumps(extra, ensure_ascii=False)) if extra else NONE)
+
+    sections = [
+        categories,
+        extras,
+        question_starts,
+        questions,
+        answer_starts,
+        answers,
+        string_starts,
+        pool,
+    ]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        position = _align(position)
+        offsets.append(position)
+        position += len(memoryview(section).cast("B"))
+
+    shm = shared_memory.SharedMemory(name, create=True, size=position)
+    try:
+        shm.buf[: HEADER.size] = HEADER.pack(
+            MAGIC, VERSION, len(categories), len(string_starts) - 1, *offsets
+        )
+        for offset, section in zip(offsets, sections):
+            data = memoryview(section).cast("B")
+            shm.buf[offset : offset + len(data)] = data
+            data.release()
+        return SharedDeck(shm, owner=True)
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+
+
+class SharedDeck(Sequence):
+    """A deck laid out by :func:`publish` in shared memory.
+
+    Cards are read through read-only views of the shared block, so every
+    process attached to it uses the same physical memory. Indexing returns a
+    :class:`CardView`, which decodes a card's strings only when they are
+    accessed. The process that published the deck owns the block:
+    :meth:`unlink` (or leaving a ``with`` block) frees it once every process
+    is done with it.
+    """
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf.toreadonly()
+        header = bytes(self.buf[: HEADER.size])
+        if len(header) < HEADER.size or not header.startswith(MAGIC):
+            self.close()
+            raise ValueError(f"{shm.name} is not a shared ptmem deck")
+        (
+            _,
+            version,
+            self.card_count,
+            self.string_count,
+            *sections,
+        ) = HEADER.unpack(header)
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"{shm.name} has unsupported deck version {version}")
+        count = self.card_count
+
+        def section(n, typecode, length):
+            start = sections[n]
+            size = array(typecode).itemsize * length
+            return self.buf[start : start + size].cast(typecode)
+
+        self.categories = section(0, "I", count)
+        self.extras = section(1, "I", count)
+        self.question_starts = section(2, "I", count + 1)
+        self.questions = section(3, "I", self.question_starts[count])
+        self.answer_starts = section(4, "I", count + 1)
+        self.answers = section(5, "I", self.answer_starts[count])
+        self.string_starts = section(6, "Q", self.string_count + 1)
+        self.pool = section(7, "B", self.string_starts[self.string_count])
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to the deck published under ``name`` by another process."""
+        # Only the owner may unlink the block, so it is not tracked here
+        return cls(shared_memory.SharedMemory(name, track=False))
+
+    @property
+    def name(self):
+        """Name other processes pass to :meth:`attach`."""
+        return self.shm.name
+
+    def __len__(self):
+        return self.card_count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [CardView(self, j) for j in range(*i.indices(self.card_count))]
+        if i < 0:
+            i += self.card_count
+        if not 0 <= i < self.card_count:
+            raise IndexError("card index out of range")
+        return CardView(self, i)
+
+    def select(self, trie, pattern):
+        """Return views of the cards whose category matches ``pattern``, in
+        deck order.
+
+        ``trie`` is a :class:`~ptmem.categories.CategoryTrie` built over the
+        same cards, as in ``publish(trie.index(cards))``. Only the matching
+        categories and cards are visited, so the cost depends on the size of
+        the selection rather than of the deck.
+        """
+        if trie.count != self.card_count:
+            raise ValueError("the category trie was not built over this deck")
+        return [
+            CardView(self, i)
+            for start, end in trie.select(pattern)
+            for i in range(start, end)
+        ]
+
+    def string_bytes(self, string_id):
+        """Return string ``string_id`` as a read-only view of its UTF-8 bytes,
+        without copying it. The view must be released before :meth:`close`."""
+        return self.pool[
+            self.string_starts[string_id] : self.string_starts[string_id + 1]
+        ]
+
+    def string(self, string_id):
+        """Return string ``string_id``."""
+        starts = self.string_starts
+        # The slice is released as soon as it has been decoded
+        return str(self.pool[starts[string_id] : starts[string_id + 1]], "utf-8")
+
+    def close(self):
+        """Detach from the block; cards can no longer be read."""
+        for view in [
+            "categories",
+            "extras",
+            "question_starts",
+            "questions",
+            "answer_starts",
+            "answers",
+            "string_starts",
+            "pool",
+            "buf",
+        ]:
+            if hasattr(self, view):
+                getattr(self, view).release()
+        self.shm.close()
+
+    def unlink(self):
+        """Free the block once every process has closed it. Only the owner
+        may do this."""
+        if not self.owner:
+            raise PermissionError("only the publishing process can unlink a deck")
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+
+class CardView(Mapping):
+    """Read-only view of a card in a :class:`SharedDeck`.
+
+    It behaves like the card dict that was published: ``view["questions"]``,
+    ``dict(view)`` and comparisons with dicts all work.
+    """
+
+    __slots__ = ("deck", "index")
+
+    def __init__(self, deck, index):
+        self.deck = deck
+        self.index = index
+
+    def _strings(self, starts, ids):
+        string = self.deck.string
+        return [string(s) for s in ids[starts[self.index] : starts[self.index + 1]]]
+
+    def _extra(self):
+        extra = self.deck.extras[self.index]
+        return {} if extra == NONE else json.loads(self.deck.string(extra))
+
+    def __getitem__(self, key):
+        deck = self.deck
+        if key == "questions":
+            return self._strings(deck.question_starts, deck.questions)
+        if key == "answers":
+            return self._strings(deck.answer_starts, deck.answers)
+        if key == "category":
+            category = deck.categories[self.index]
+            return None if category == NONE else deck.string(category)
+        return self._extra()[key]
+
+    def __iter__(self):
+        yield from FIELDS
+        yield from self._extra()
+
+    def __len__(self):
+        return len(FIELDS) + len(self._extra())
+
+    def __repr__(self):
+        return f"CardView({dict(self)!r})"
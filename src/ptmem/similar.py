@@ -0,0 +1,173 @@
+import operator
+import re
+import zlib
+from array import array
+
+SHINGLE_SIZE = 4
+NUM_BINS = 64
+EMPTY = 0xFFFFFFFF
+
+NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize(card):
+    """Return a card's questions and answers as lowercase words separated by
+    single spaces, so punctuation and spacing do not affect similarity."""
+    text = " ".join(card["questions"] + card["answers"])
+    return NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+def shingles(card, size=SHINGLE_SIZE):
+    """Return the set of hashed character shingles of a card's text."""
+    text = normalize(card)
+    if len(text) <= size:
+        return {zlib.crc32(text.encode())} if text else set()
+    return {
+        zlib.crc32(text[i : i + size].encode()) for i in range(len(text) - size + 1)
+    }
+
+
+def signature(hashes, num_bins=NUM_BINS):
+    """Compute a MinHash signature with one-permutation hashing.
+
+    Each shingle hash is looked at once: its low part picks one of
+    ``num_bins`` bins and its high part competes for that bin's minimum.
+    Empty bins borrow the value of the next non-empty bin, offset by the
+    distance, so that signatures of short texts stay comparable.
+    """
+    bins = array("I", [EMPTY]) * num_bins
+    for h in hashes:
+        i = h % num_bins
+        value = h // num_bins
+        if value < bins[i]:
+            bins[i] = value
+    filled = [i for i in range(num_bins) if bins[i] != EMPTY]
+    if filled and len(filled) < num_bins:
+        for i in range(num_bins):
+            if bins[i] == EMPTY:
+                distance = 1
+                while bins[(i + distance) % num_bins] == EMPTY:
+                    distance += 1
+                source = bins[(i + distance) % num_bins]
+                bins[i] = (source + distance * 0x9E3779B1) % EMPTY
+    return bins
+
+
+def estimate_similarity(a, b):
+    """Estimate the Jaccard similarity of two cards from their signatures."""
+    return sum(map(operator.eq, a, b)) / len(a)
+
+
+def choose_bands(threshold, num_bins=NUM_BINS):
+    """Return ``(bands, rows)`` with ``bands * rows == num_bins`` whose LSH
+    threshold ``(1 / bands) ** (1 / rows)`` is as high as possible without
+    exceeding ``threshold``."""
+    best = (num_bins, 1)
+    for rows in range(1, num_bins + 1):
+        if num_bins % rows == 0:
+            bands = num_bins // rows
+            if (1 / bands) ** (1 / rows) <= threshold:
+                best = (bands, rows)
+    return best
+
+
+def find_similar(cards, threshold=0.7, num_bins=NUM_BINS):
+    """Group near-duplicate cards into clusters.
+
+    ``cards`` is consumed one at a time; only the signatures are kept. Cards
+    whose signatures agree on a whole LSH band become candidates, and each
+    candidate is compared with the first card of its bucket rather than with
+    every other card, which keeps the work close to linear. Returns a list of
+    clusters, each a sorted list of card indices, ordered by first card.
+    """
+    bands, rows = choose_bands(threshold, num_bins)
+    signatures = []
+    buckets = [{} for _ in range(bands)]
+    for card_id, card in enumerate(cards):
+        hashes = shingles(card)
+        sig = signature(hashes, num_bins)
+        signatures.append(sig)
+        if not hashes:
+            continue
+        for band in range(bands):
+            key = sig[band * rows : (band + 1) * rows].tobytes()
+            buckets[band].setdefault(key, []).append(card_id)
+
+    parents = list(range(len(signatures)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for band_buckets in buckets:
+        for members in band_buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                if find(first) == find(other):
+                    continue
+                if (
+                    estimate_similarity(signatures[first], signatures[other])
+                    >= threshold
+                ):
+                    parents[find(other)] = find(first)
+
+    clusters = {}
+    for card_id in range(len(signatures)):
+        clusters.setdefault(find(card_id), []).append(card_id)
+    return sorted(
+        (members for members in clusters.values() if len(members) > 1),
+        key=lambda members: members[0],
+    )
+
+
+def match_similar(old_cards, new_cards, threshold=0.7, num_bins=NUM_BINS):
+    """Pair cards of ``new_cards`` with near-identical cards of ``old_cards``
+    in the same category.
+
+    Old cards are bucketed by category and LSH band as in
+    :func:`find_similar`, and each new card is only compared with the old
+    cards that share a bucket with it. Pairs whose estimated similarity
+    reaches ``threshold`` are taken best first, using every card at most
+    once. Returns a dict from the index of a new card to the index of the old
+    card it matches.
+    """
+    bands, rows = choose_bands(threshold, num_bins)
+
+    def keys(card, sig):
+        category = card["category"] or ""
+        for band in range(bands):
+            yield (category, band, sig[band * rows : (band + 1) * rows].tobytes())
+
+    old_signatures = []
+    buckets = {}
+    for old_id, card in enumerate(old_cards):
+        hashes = shingles(card)
+        sig = signature(hashes, num_bins)
+        old_signatures.append(sig)
+        if hashes:
+            for key in keys(card, sig):
+                buckets.setdefault(key, []).append(old_id)
+
+    pairs = []
+    for new_id, card in enumerate(new_cards):
+        hashes = shingles(card)
+        if not hashes:
+            continue
+        sig = signature(hashes, num_bins)
+        candidates = set()
+        for key in keys(card, sig):
+            candidates.update(buckets.get(key, ()))
+        for old_id in candidates:
+            similarity = estimate_similarity(sig, old_signatures[old_id])
+            if similarity >= threshold:
+                pairs.append((-similarity, new_id, old_id))
+
+    matches = {}
+    used = set()
+    for _, new_id, old_id in sorted(pairs):
+        if new_id not in matches and old_id not in used:
+            matches[new_id] = old_id
+            used.add(old_id)
+    return matches
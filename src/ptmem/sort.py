@@ -0,0 +1,83 @@
+import heapq
+import itertools
+import json
+import tempfile
+
+# Number of cards sorted in memory before a run is spilled to disk
+RUN_SIZE = 100_000
+
+
+def category_key(card):
+    return card["category"] or ""
+
+
+def question_key(card):
+    return "; ".join(card["questions"]).casefold()
+
+
+def confidence_key(flash_writer):
+    """Return a key function that orders cards by the confidence
+    ``flash_writer``, a :class:`~ptmem.writers.FlashWriter`, will write for
+    them. Cards without a numeric confidence sort as 0."""
+
+    def key(card):
+        confidence = flash_writer.confidence(card)
+        try:
+            return float(confidence)
+        except ValueError:
+            return 0.0
+
+    return key
+
+
+def external_sort(cards, key, run_size=RUN_SIZE):
+    """Yield ``cards`` sorted by ``key``, keeping input order for equal keys.
+
+    Up to ``run_size`` cards are sorted in memory at a time. If there are
+    more, each sorted run is spilled to a temporary file as JSON lines and the
+    runs are merged with :func:`heapq.merge`, so memory use is bounded by the
+    run size rather than by the deck. Keys must survive a round trip through
+    JSON (strings and numbers do).
+    """
+    cards = iter(cards)
+    sequence = itertools.count()
+
+    def next_run():
+        records = (
+            (key(card), next(sequence), card)
+            for card in itertools.islice(cards, run_size)
+        )
+        return sorted(records, key=lambda record: record[:2])
+
+    run = next_run()
+    if len(run) < run_size:
+        for _, _, card in run:
+            yield card
+        return
+
+    with tempfile.TemporaryDirectory(prefix="ptmem-sort-") as tmpdir:
+        runs = []
+        try:
+            while run:
+                f = open(f"{tmpdir}/run{len(runs)}.jsonl", "w+", encoding="utf-8")
+                runs.append(f)
+                for record in run:
+                    f.write(json.dumps(record, ensure_ascii=False))
+                    f.write("\n")
+                f.seek(0)
+                run = next_run()
+
+            merged = heapq.merge(
+                *[map(json.loads, f) for f in runs], key=lambda record: record[:2]
+            )
+            for _, _, card in merged:
+                yield card
+        finally:
+            for f in runs:
+                f.close()
+
+
+SORT_KEYS = {
+    "category": category_key,
+    "question": question_key,
+}
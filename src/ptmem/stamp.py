@@ -0,0 +1,56 @@
+import json
+import os
+
+from .compress import temp_path
+
+# A stamp is a small JSON file written next to the output after a successful
+# run. It records the command line and the size and modification time of
+# every file the run read or wrote: the inputs, the fragments they included,
+# any review history, and the outputs. While none of these change, running the
+# same command again would write the same outputs, so it can be skipped.
+VERSION = 1
+
+
+def stamp_path(output):
+    """Return the path of the stamp for a run writing ``output``."""
+    return f"{output}.ptmem-stamp"
+
+
+def file_stats(paths):
+    """Return ``{path: [size, mtime_ns]}`` for ``paths``, with ``None`` for a
+    path that does not exist."""
+    stats = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            stats[path] = None
+        else:
+            stats[path] = [st.st_size, st.st_mtime_ns]
+    return stats
+
+
+def is_current(path, argv):
+    """Return whether the stamp at ``path`` was written by a run of ``argv``
+    and no file it records has changed since."""
+    try:
+        with open(path) as f:
+            stamp = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    if not isinstance(stamp, dict) or stamp.get("version") != VERSION:
+        return False
+    if stamp.get("argv") != list(argv):
+        return False
+    files = stamp.get("files", {})
+    return file_stats(files) == files
+
+
+def write_stamp(path, argv, paths):
+    """Write a stamp recording ``argv`` and the current state of the files at
+    ``paths``."""
+    stamp = {"version": VERSION, "argv": list(argv), "files": file_stats(paths)}
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w") as f:
+        json.dump(stamp, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,307 @@
+import csv
+import hashlib
+import json
+import os
+import sys
+
+from .compress import (
+    compression_for_path,
+    detect_compression,
+    file_digest,
+    open_input,
+    open_output,
+    temp_path,
+)
+from .flash import CONTENT_FORMATS, HEADER_V2, ConfidenceTable, iter_lines
+from .history import card_hash
+from .similar import match_similar
+
+
+class Writer:
+    """Base class for the streaming output writers.
+
+    Cards are passed to :meth:`write` one at a time as they are parsed. Output
+    goes to a temporary file next to ``path`` that replaces it on
+    :meth:`close`, so a failed run leaves any existing output untouched. Output
+    is compressed if the extension of ``path`` names a compression format. A
+    ``path`` of ``-`` writes to stdout.
+
+    With ``keep_identical``, a digest of the output is computed as it is
+    written, and an existing file with the same content is left untouched
+    (keeping its modification time) instead of being replaced.
+    """
+
+    newline = None
+
+    def __init__(self, path, keep_identical=False):
+        self.path = path
+        self.digest = None
+        if path == "-":
+            self.tmp_path = None
+            self.file = sys.stdout
+            return
+        if keep_identical:
+            self.digest = hashlib.sha256()
+        self.tmp_path = temp_path(path)
+        self.file = open_output(
+            self.tmp_path,
+            compression_for_path(path),
+            newline=self.newline,
+            digest=self.digest,
+        )
+
+    def write(self, card):
+        raise NotImplementedError
+
+    def finish(self):
+        """Write anything that has to follow the last card."""
+
+    def close(self):
+        self.finish()
+        if self.tmp_path is None:
+            self.file.flush()
+            return
+        self.file.close()
+        if self.digest is not None and self.unchanged():
+            os.unlink(self.tmp_path)
+            return
+        os.replace(self.tmp_path, self.path)
+
+    def unchanged(self):
+        """Return whether the file at ``path`` already has exactly the
+        content just written, in the same compression."""
+        return (
+            os.path.isfile(self.path)
+            and detect_compression(self.path) == compression_for_path(self.path)
+            and file_digest(self.path, self.digest.name) == self.digest.digest()
+        )
+
+    def abort(self):
+        if self.tmp_path is None:
+            return
+        self.file.close()
+        os.unlink(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonWriter(Writer):
+    """Writes cards as an indented JSON array, identical to ``json.dump``."""
+
+    def __init__(self, path, keep_identical=False):
+        super().__init__(path, keep_identical)
+        self.count = 0
+
+    def write(self, card):
+        body = json.dumps(card, indent=4).replace("\n", "\n    ")
+        self.file.write(("[\n    " if self.count == 0 else ",\n    ") + body)
+        self.count += 1
+
+    def finish(self):
+        self.file.write("[]" if self.count == 0 else "\n]")
+
+
+class NdjsonWriter(Writer):
+    """Writes one compact JSON object per card, per line.
+
+    The file is flushed every ``flush_every`` cards so that consumers reading
+    from a pipe can start before the deck is finished.
+    """
+
+    flush_every = 1000
+
+    def __init__(self, path, keep_identical=False):
+        super().__init__(path, keep_identical)
+        self.count = 0
+
+    def write(self, card):
+        self.file.write(json.dumps(card, separators=(",", ":")) + "\n")
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.file.flush()
+
+
+class FlashWriter(Writer):
+    """Writes cards in fla.sh format, one ``category:questions:answers:confidence``
+    line per card.
+
+    If the output file already exists, the confidence of every card that is
+    still present is carried over, whichever fla.sh version the file is in;
+    new cards start at their own ``confidence`` key (set by
+    :func:`ptmem.loaders.iter_flash`), or 0. If ``history`` (a dict from
+    :func:`ptmem.history.load_confidences`) is given, a card's latest logged
+    score takes precedence.
+
+    With ``fuzzy_threshold``, new cards that are not in the existing file
+    (such as cards whose question had a typo fixed) take the confidence of
+    the most similar remaining card of the same category, if their
+    similarity reaches the threshold. All lines are then held back until
+    the last card is written.
+    """
+
+    version = 1
+
+    def __init__(self, path, history=None, keep_identical=False, fuzzy_threshold=None):
+        self.existing_cards = ConfidenceTable(self.version)
+        if os.path.exists(path) and os.path.isfile(path):
+            self.existing_cards = ConfidenceTable.from_file(path)
+        self.history = history
+        self.format_content = CONTENT_FORMATS[self.version]
+        self.fuzzy_threshold = fuzzy_threshold
+        # With fuzzy_threshold: [content, confidence] of every card, the line
+        # number and card of those without a known confidence, and the
+        # existing content of those with one
+        self.lines = []
+        self.unmatched = []
+        self.matched = set()
+        super().__init__(path, keep_identical)
+
+    def confidence(self, card, content=None):
+        """Return the confidence to write for ``card``.
+
+        ``content`` is the card's content as formatted by this writer, if the
+        caller already has it.
+        """
+        if self.history:
+            score = self.history.get(card_hash(card))
+            if score is not None:
+                return str(score)
+        # Keep existing confidence, or use the card's own for new cards
+        return self.existing_cards.get(
+            self.existing_content(card, content), card.get("confidence", "0")
+        )
+
+    def existing_content(self, card, content=None):
+        """Return ``card``'s content as formatted in the existing file, as
+        UTF-8 bytes."""
+        if content is None or self.existing_cards.version != self.version:
+            content = CONTENT_FORMATS[self.existing_cards.version](card)
+        return content.encode()
+
+    def write(self, card):
+        content = self.format_content(card)
+        if self.fuzzy_threshold is None:
+            print(f"{content}:{self.confidence(card, content)}", file=self.file)
+            return
+        existing = self.existing_content(card, content)
+        if self.existing_cards.get(existing) is not None:
+            self.matched.add(existing)
+        elif "confidence" not in card and not (
+            self.history and card_hash(card) in self.history
+        ):
+            self.unmatched.append((len(self.lines), card))
+        self.lines.append([content, self.confidence(card, content)])
+
+    def finish(self):
+        if self.fuzzy_threshold is None:
+            return
+        if self.unmatched and os.path.isfile(self.path):
+            self.carry_over()
+        for content, confidence in self.lines:
+            print(f"{content}:{confidence}", file=self.file)
+
+    def carry_over(self):
+        """Give unmatched new cards the confidence of similar existing cards
+        that no new card matched exactly."""
+        categories = {card["category"] or "" for _, card in self.unmatched}
+        old_cards = []
+        confidences = []
+        with open_input(self.path) as f:
+            for _, card, confidence in iter_lines(f, restore_colons=True):
+                if card["category"] not in categories:
+                    continue
+                if self.existing_content(card) in self.matched:
+                    continue
+                old_cards.append(card)
+                confidences.append(confidence)
+        matches = match_similar(
+            old_cards, [card for _, card in self.unmatched], self.fuzzy_threshold
+        )
+        for new_id, old_id in matches.items():
+            self.lines[self.unmatched[new_id][0]][1] = confidences[old_id]
+
+    def write_contents(self, contents):
+        """Write a line for each card's content, given as UTF-8 bytes by
+        :func:`ptmem.flash.iter_contents`.
+
+        Lines go straight to the binary buffer under the text file, so no
+        ``str`` is created per card. This bypasses ``history`` and only
+        carries over confidences from a version 1 file.
+        """
+        self.file.flush()
+        get = self.existing_cards.get_bytes
+        line = b"%s:%s" + os.linesep.encode()
+        self.file.buffer.writelines(
+            line % (content, get(content, b"0")) for content in contents
+        )
+
+
+class FlashV2Writer(FlashWriter):
+    """Writes version 2 fla.sh files.
+
+    The file starts with a header line, and fields are escaped with
+    backslashes instead of having ``:`` replaced, so they can be read back
+    exactly by :func:`ptmem.loaders.iter_flash`.
+    """
+
+    version = 2
+
+    def __init__(self, path, history=None, keep_identical=False, fuzzy_threshold=None):
+        super().__init__(
+            path,
+            history=history,
+            keep_identical=keep_identical,
+            fuzzy_threshold=fuzzy_threshold,
+        )
+        print(HEADER_V2, file=self.file)
+
+
+class CsvWriter(Writer):
+    """Writes one ``questions,answers,category`` row per card.
+
+    Multiple questions and answers are joined with ``question_joiner`` and
+    ``answer_joiner``, which makes the file importable into Anki.
+    """
+
+    newline = ""
+    dialect = "excel"
+
+    def __init__(
+        self, path, question_joiner="; ", answer_joiner="; ", keep_identical=False
+    ):
+        super().__init__(path, keep_identical)
+        self.question_joiner = question_joiner
+        self.answer_joiner = answer_joiner
+        self.writer = csv.writer(self.file, dialect=self.dialect)
+
+    def write(self, card):
+        self.writer.writerow(
+            [
+                self.question_joiner.join(card["questions"]),
+                self.answer_joiner.join(card["answers"]),
+                card["category"] or "",
+            ]
+        )
+
+
+class TsvWriter(CsvWriter):
+    """Writes one tab-separated ``questions answers category`` row per card."""
+
+    dialect = "excel-tab"
+
+
+WRITERS = {
+    "json": JsonWriter,
+    "ndjson": NdjsonWriter,
+    "fla.sh": FlashWriter,
+    "fla.sh-v2": FlashV2Writer,
+    "csv": CsvWriter,
+    "tsv": TsvWriter,
+}
@@ -0,0 +1,17 @@
+from unittest.mock import patch
+
+import pytest
+
+from ptmem.main import main
+
+
+@pytest.fixture
+def convert():
+    """Return a function that runs the ptmem command line with the given
+    arguments."""
+
+    def convert(*argv):
+        with patch("sys.argv", ["ptmem", *argv]):
+            main()
+
+    return convert
@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from ptmem.categories import CategoryTrie, match_path, split_category
+from ptmem.main import main
+
+PTMEM_CONTENT = """- Uncategorized?
++ Yes
+
+# Biology
+- What is biology?
++ The study of life
+
+# Biology / Cells
+- Powerhouse?
++ Mitochondria
+
+# Biology/Cells/Organelles
+- Protein factory?
++ Ribosome
+
+# Chemistry
+- H2O?
++ Water
+
+# Biology/Genes
+- DNA?
++ Deoxyribonucleic acid
+
+# Biology/Cells
+- Smallest unit of life?
++ The cell
+"""
+
+CATEGORIES = [
+    None,
+    "Biology",
+    "Biology/Cells",
+    "Biology/Cells/Organelles",
+    "Chemistry",
+    "Biology/Genes",
+    "Biology/Cells",
+]
+
+
+class TestPTMemCategories:
+    """Test suite for hierarchical categories"""
+
+    def test_match_path(self):
+        """Test that * matches one name and ** any number of names"""
+        path = split_category("Biology / Cells/Organelles")
+        assert path == ("Biology", "Cells", "Organelles")
+        assert match_path(split_category("Biology/**"), path)
+        assert match_path(split_category("Biology/**"), ("Biology",))
+        assert match_path(split_category("**/Organelles"), path)
+        assert match_path(split_category("Bio*/*/*"), path)
+        assert not match_path(split_category("Biology/*"), path)
+        assert not match_path(split_category("Biology"), path)
+        assert match_path(split_category("**"), split_category(None))
+
+    def test_trie_counts_and_selection(self):
+        """Test per-node counts, merged ID ranges and prefix selection"""
+        trie = CategoryTrie()
+        for category in CATEGORIES:
+            trie.add(category)
+        biology = trie.find("Biology")
+        assert (biology.count, biology.total) == (1, 5)
+        assert trie.find("Biology/Cells").ranges == [[2, 3], [6, 7]]
+        assert trie.root.total == 7
+        assert trie.find("Physics") is None
+
+        assert trie.select("Biology/**") == [(1, 4), (5, 7)]
+        assert trie.select("Biology/*") == [(2, 3), (5, 7)]
+        assert trie.select("**/Cells/**") == [(2, 4), (6, 7)]
+        assert trie.select("**") == [(0, 7)]
+        assert trie.select("Physics/**") == []
+        for pattern in ["Biology/**", "*", "**/Cells", "Biology/**/Organelles"]:
+            expected = [
+                card_id
+                for card_id, category in enumerate(CATEGORIES)
+                if match_path(split_category(pattern), split_category(category))
+            ]
+            ids = [i for start, end in trie.select(pattern) for i in range(start, end)]
+            assert ids == expected
+
+    def test_category_option_and_command(self, capsys):
+        """Test exporting a subtree with --category and listing the tree"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            output_path = os.path.join(tmpdir, "deck.json")
+            with open(input_path, "w") as f:
+                f.write(PTMEM_CONTENT)
+
+            with patch(
+                "sys.argv",
+                ["ptmem", input_path, output_path, "--category", "Biology/**"],
+            ):
+                main()
+            with open(output_path) as f:
+                questions = [card["questions"][0] for card in json.load(f)]
+            assert questions == [
+                "What is biology?",
+                "Powerhouse?",
+                "Protein factory?",
+                "DNA?",
+                "Smallest unit of life?",
+            ]
+
+            with patch("sys.argv", ["ptmem", "categories", input_path]):
+                main()
+            assert capsys.readouterr().out == (
+                "(none)\t1\t0\n"
+                "Biology\t5\t1\n"
+                "  Cells\t3\t2,6\n"
+                "    Organelles\t1\t3\n"
+                "  Genes\t1\t5\n"
+                "Chemistry\t1\t4\n"
+            )
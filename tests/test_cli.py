@@ -343,3 +343,159 @@ class TestPTMemCLI:
                 finally:
                     os.unlink(input_file.name)
                     os.unlink(output_file.name)
+
+    def test_check_reports_diagnostics(self, capsys):
+        """Test that --check reports file:line diagnostics and still writes output"""
+        ptmem_content = """# Check
+
+- Question without answer
+
++ Orphaned answer
+
+#Bad category
+- Valid question
++ Valid answer
+"""
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".ptmem", delete=False
+        ) as input_file:
+            input_file.write(ptmem_content)
+            input_file.flush()
+
+            with tempfile.NamedTemporaryFile(
+                mode="w", suffix=".json", delete=False
+            ) as output_file:
+                try:
+                    with patch(
+                        "sys.argv",
+                        ["ptmem", input_file.name, output_file.name, "--check"],
+                    ):
+                        with pytest.raises(SystemExit) as excinfo:
+                            main()
+                    assert excinfo.value.code == 1
+
+                    errors = capsys.readouterr().err.splitlines()
+                    assert errors == [
+                        f"{input_file.name}:3: question without an answer",
+                        f"{input_file.name}:5: answer without a question "
+                        "(attached to the next card)",
+                        f"{input_file.name}:7: unrecognized line: '#Bad category'",
+                    ]
+
+                    with open(output_file.name, "r") as f:
+                        import json
+
+                        result = json.load(f)
+                    assert len(result) == 2
+                finally:
+                    os.unlink(input_file.name)
+                    os.unlink(output_file.name)
+
+    def test_check_clean_input(self, capsys):
+        """Test that --check exits normally when there is nothing to report"""
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".ptmem", delete=False
+        ) as input_file:
+            input_file.write("# Test\n\n- Question?\n+ Answer\n")
+            input_file.flush()
+
+            with tempfile.NamedTemporaryFile(
+                mode="w", suffix=".json", delete=False
+            ) as output_file:
+                try:
+                    with patch(
+                        "sys.argv",
+                        ["ptmem", input_file.name, output_file.name, "--check"],
+                    ):
+                        main()
+                    assert capsys.readouterr().err == ""
+                finally:
+                    os.unlink(input_file.name)
+                    os.unlink(output_file.name)
+
+    def test_max_errors_stops_early(self, capsys):
+        """Test that --max-errors stops parsing without writing output"""
+        ptmem_content = "".join(f"bad line {i}\n" for i in range(10))
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".ptmem", delete=False
+        ) as input_file:
+            input_file.write(ptmem_content)
+            input_file.flush()
+
+            output_path = input_file.name + ".json"
+            try:
+                with patch(
+                    "sys.argv",
+                    ["ptmem", input_file.name, output_path, "--max-errors", "2"],
+                ):
+                    with pytest.raises(SystemExit) as excinfo:
+                        main()
+                assert excinfo.value.code == 1
+
+                err = capsys.readouterr().err
+                assert f"{input_file.name}:2:" in err
+                assert f"{input_file.name}:3:" not in err
+                assert not os.path.exists(output_path)
+            finally:
+                os.unlink(input_file.name)
+
+    def test_multiple_outputs_single_parse(self):
+        """Test writing several output types from one run with -o TYPE=PATH"""
+        ptmem_content = """# Test
+
+- Test question?
++ Test answer
+"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            json_path = os.path.join(tmpdir, "deck.json")
+            flash_path = os.path.join(tmpdir, "deck.flash")
+            tsv_path = os.path.join(tmpdir, "deck.tsv")
+            with open(input_path, "w") as f:
+                f.write(ptmem_content)
+
+            with patch(
+                "sys.argv",
+                [
+                    "ptmem",
+                    input_path,
+                    json_path,
+                    "-o",
+                    f"fla.sh={flash_path}",
+                    "--also-output",
+                    f"tsv={tsv_path}",
+                ],
+            ):
+                main()
+
+            with open(json_path, "r") as f:
+                import json
+
+                assert json.load(f) == [
+                    {
+                        "questions": ["Test question?"],
+                        "answers": ["Test answer"],
+                        "category": "Test",
+                    }
+                ]
+            with open(flash_path, "r") as f:
+                assert f.read() == "Test:Test question?:Test answer:0\n"
+            with open(tsv_path, "r") as f:
+                assert f.read() == "Test question?\tTest answer\tTest\n"
+
+    def test_invalid_extra_output(self):
+        """Test error handling for malformed -o specifications"""
+        for spec in ["deck.json", "xml=deck.xml", "json="]:
+            with patch("sys.argv", ["ptmem", "input.ptmem", "out.json", "-o", spec]):
+                with pytest.raises(SystemExit) as excinfo:
+                    main()
+                assert excinfo.value.code == 2
+
+    def test_duplicate_output_path(self):
+        """Test that two outputs cannot share a path"""
+        with patch(
+            "sys.argv", ["ptmem", "input.ptmem", "out.json", "-o", "tsv=out.json"]
+        ):
+            with pytest.raises(SystemExit) as excinfo:
+                main()
+            assert excinfo.value.code == 2
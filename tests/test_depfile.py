@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+import pytest
+
+from ptmem.depfile import escape_path, format_depfile
+
+
+class TestPTMemDepfile:
+    """Test suite for -MD dependency files"""
+
+    def test_format_depfile(self):
+        """Test Makefile escaping and the layout of the rule"""
+        assert escape_path("my deck #1.ptmem") == "my\\ deck\\ \\#1.ptmem"
+        assert escape_path("a\\ b$") == "a\\\\\\ b$$"
+        assert escape_path("C:\\decks\\x.ptmem") == "C:\\decks\\x.ptmem"
+        assert format_depfile(
+            ["deck.json", "deck.flash"], ["a.ptmem", "b.ptmem", "a.ptmem"], ["b.ptmem"]
+        ) == ("deck.json deck.flash: \\\n  a.ptmem \\\n  b.ptmem\n\nb.ptmem:\n")
+
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    def test_depfile_lists_inputs_and_fragments(self, jobs, monkeypatch, convert):
+        """Test that -MD lists every input and nested fragment for every
+        output"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            monkeypatch.chdir(tmpdir)
+            os.mkdir("shared")
+            with open("deck.ptmem", "w") as f:
+                f.write("# Math\n\n- Q?\n+ A\n\n@ shared/units.ptmem\n")
+            with open("more.ptmem", "w") as f:
+                f.write("- More?\n+ Yes\n")
+            with open("shared/units.ptmem", "w") as f:
+                f.write("- Unit?\n+ U\n\n@ si.ptmem\n")
+            with open("shared/si.ptmem", "w") as f:
+                f.write("- SI?\n+ Metric\n")
+
+            convert(
+                "deck.ptmem",
+                "more.ptmem",
+                "deck.json",
+                "-o",
+                "fla.sh=deck.flash",
+                "-j",
+                jobs,
+                "-MD",
+                "deck.d",
+            )
+            with open("deck.d") as f:
+                content = f.read()
+            fragments = (
+                os.path.join("shared", "si.ptmem"),
+                os.path.join("shared", "units.ptmem"),
+            )
+            target, _, rest = content.partition(":")
+            assert target == "deck.json deck.flash"
+            rule, *phony = rest.split("\n\n")
+            assert sorted(rule.split()[1::2]) == sorted(
+                ["deck.ptmem", "more.ptmem", *fragments]
+            )
+            assert sorted(p.strip() for p in phony) == [
+                f"{path}:" for path in fragments
+            ]
+
+    def test_depfile_rejects_stdout(self, convert):
+        """Test that -MD needs the outputs to be files"""
+        with pytest.raises(SystemExit) as excinfo:
+            convert("deck.ptmem", "-", "-MD", "deck.d")
+        assert excinfo.value.code == 2
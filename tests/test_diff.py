@@ -0,0 +1,126 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from ptmem.diff import Entry, diff_entries, iter_entries
+from ptmem.main import main
+
+
+def make_entry(question, answer, location, confidence=None):
+    card = {"questions": [question], "answers": [answer], "category": "Math"}
+    return Entry(card, location, confidence)
+
+
+class TestPTMemDiff:
+    """Test suite for the deck diff engine"""
+
+    def test_diff_entries(self):
+        """Test added, removed, modified and unchanged cards"""
+        old = [
+            make_entry("1 + 1?", "2", "old:1"),
+            make_entry("2 + 2?", "5", "old:2"),
+            make_entry("3 + 3?", "6", "old:3"),
+            make_entry("4 + 4?", "8", "old:4"),
+        ]
+        new = [
+            make_entry("1 + 1?", "2", "new:1"),
+            make_entry("2 + 2?", "4", "new:2"),
+            make_entry("5 + 5?", "10", "new:3"),
+            make_entry("3 + 3?", "6", "new:4"),
+        ]
+        changes = [
+            (
+                change.kind,
+                change.old and change.old.location,
+                change.new and change.new.location,
+            )
+            for change in diff_entries(iter(old), iter(new))
+        ]
+        assert changes == [
+            ("modified", "old:2", "new:2"),
+            ("added", None, "new:3"),
+            ("removed", "old:4", None),
+        ]
+
+    def test_duplicate_cards(self):
+        """Test that duplicated cards are matched one to one"""
+        old = [make_entry("Q?", "A", "old:1")]
+        new = [make_entry("Q?", "A", "new:1"), make_entry("Q?", "A", "new:2")]
+        changes = list(diff_entries(iter(old), iter(new)))
+        assert [(change.kind, change.new.location) for change in changes] == [
+            ("added", "new:2")
+        ]
+
+    def test_confidence_changes(self):
+        """Test that confidence changes are reported for fla.sh entries"""
+        old = [make_entry("Q?", "A", "old:1", "0"), make_entry("R?", "B", "old:2", "1")]
+        new = [make_entry("Q?", "A", "new:1", "3"), make_entry("R?", "B", "new:2", "1")]
+        changes = list(diff_entries(iter(old), iter(new)))
+        assert len(changes) == 1
+        assert changes[0].kind == "confidence"
+        assert (changes[0].old.confidence, changes[0].new.confidence) == ("0", "3")
+
+    def test_iter_flash_entries(self):
+        """Test reading cards and confidences back from a fla.sh file"""
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".flash", delete=False
+        ) as flash_file:
+            flash_file.write("Math:Q1; Q2:A1:4\nmalformed\nMath:Q3::0\n")
+        try:
+            entries = list(iter_entries(flash_file.name, "fla.sh"))
+            assert entries == [
+                Entry(
+                    {"questions": ["Q1", "Q2"], "answers": ["A1"], "category": "Math"},
+                    f"{flash_file.name}:1",
+                    "4",
+                ),
+                Entry(
+                    {"questions": ["Q3"], "answers": [], "category": "Math"},
+                    f"{flash_file.name}:3",
+                    "0",
+                ),
+            ]
+        finally:
+            os.unlink(flash_file.name)
+
+    def test_diff_command(self, capsys):
+        """Test the diff command on two ptmem sources"""
+        old_content = """# Math
+
+- What is 2 + 2?
++ 5
+
+- What is 3 + 3?
++ 6
+"""
+        new_content = """# Math
+
+- What is 2 + 2?
++ 4
+
+- What is 4 + 4?
++ 8
+"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            old_path = os.path.join(tmpdir, "old.ptmem")
+            new_path = os.path.join(tmpdir, "new.ptmem")
+            with open(old_path, "w") as f:
+                f.write(old_content)
+            with open(new_path, "w") as f:
+                f.write(new_content)
+
+            with patch("sys.argv", ["ptmem", "diff", old_path, new_path]):
+                with pytest.raises(SystemExit) as excinfo:
+                    main()
+            assert excinfo.value.code == 1
+            assert capsys.readouterr().out.splitlines() == [
+                f"~ {new_path}:3: [Math] What is 2 + 2? -> 5 => 4",
+                f"+ {new_path}:6: [Math] What is 4 + 4? -> 8",
+                f"- {old_path}:6: [Math] What is 3 + 3? -> 6",
+            ]
+
+            with patch("sys.argv", ["ptmem", "diff", new_path, new_path]):
+                main()
+            assert capsys.readouterr().out == ""
@@ -3,6 +3,8 @@ import os
 import tempfile
 from unittest.mock import patch
 
+import pytest
+
 from ptmem.main import main
 
 
@@ -445,3 +447,45 @@ Math:Another:Question:Answer:5:extra:fields
                 finally:
                     os.unlink(input_file.name)
                     os.unlink(output_file.name)
+
+    def test_failed_run_keeps_existing_output(self):
+        """Test that an input error leaves an existing output file untouched"""
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".ptmem", delete=False
+        ) as input_file:
+            input_file.write("# Test\n\n- Question?\n+ Answer\n")
+            input_file.flush()
+
+            with tempfile.NamedTemporaryFile(
+                mode="w", suffix=".flash", delete=False
+            ) as output_file:
+                output_file.write("Test:Question?:Answer:4\n")
+                output_file.flush()
+
+                try:
+                    with patch(
+                        "sys.argv",
+                        [
+                            "ptmem",
+                            input_file.name,
+                            "missing.ptmem",
+                            output_file.name,
+                            "-t",
+                            "fla.sh",
+                        ],
+                    ):
+                        with pytest.raises(FileNotFoundError):
+                            main()
+
+                    with open(output_file.name, "r") as f:
+                        assert f.read() == "Test:Question?:Answer:4\n"
+                    output_dir = os.path.dirname(output_file.name)
+                    base = os.path.basename(output_file.name)
+                    assert not [
+                        name
+                        for name in os.listdir(output_dir)
+                        if name.startswith(base) and name.endswith(".tmp")
+                    ]
+                finally:
+                    os.unlink(input_file.name)
+                    os.unlink(output_file.name)
@@ -0,0 +1,259 @@
+import gzip
+import os
+import tempfile
+from unittest.mock import patch
+
+from ptmem.flash import (
+    ConfidenceTable,
+    escape,
+    format_content,
+    format_content_v2,
+    iter_contents,
+    parse_line_v2,
+    unescape,
+)
+from ptmem.loaders import iter_flash
+from ptmem.main import main
+from ptmem.parser import iter_input_lines, parse_cards
+
+
+class TestPTMemFlash:
+    """Test suite for fla.sh format helpers"""
+
+    def test_confidence_table_lookup(self):
+        """Test loading confidences and looking them up by card content"""
+        existing_flash_content = """Math:What is 2 + 2?:4:3
+malformed_line_without_colons
+line:with:only:two:colons
+Math:Q:A:07
+Math:Q:A:2.5
+Math:Duplicate:A:1
+Math:Duplicate:A:9
+
+"""
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".flash", delete=False
+        ) as flash_file:
+            flash_file.write(existing_flash_content)
+        try:
+            table = ConfidenceTable.from_file(flash_file.name)
+            assert table.get(b"Math:What is 2 + 2?:4") == "3"
+            assert table.get(b"line:with:only:two") == "colons"
+            assert table.get(b"Math:Q:A") == "2.5"
+            assert table.get(b"Math:Duplicate:A") == "9"
+            assert table.get(b"Math:Missing:A", "0") == "0"
+            assert len(table) == 4
+        finally:
+            os.unlink(flash_file.name)
+
+    def test_confidence_table_growth(self):
+        """Test that the table keeps every entry as it grows"""
+        table = ConfidenceTable()
+        for i in range(5000):
+            table.add(f"Cat:Question {i}:Answer".encode(), str(i % 7))
+        assert len(table) == 5000
+        assert len(table.hashes) >= 2 * 5000
+        assert all(
+            table.get(f"Cat:Question {i}:Answer".encode()) == str(i % 7)
+            for i in range(5000)
+        )
+
+    def test_confidence_table_empty_and_compressed_files(self):
+        """Test loading empty and gzip-compressed fla.sh files"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            empty_path = os.path.join(tmpdir, "empty.flash")
+            open(empty_path, "w").close()
+            assert len(ConfidenceTable.from_file(empty_path)) == 0
+
+            compressed_path = os.path.join(tmpdir, "deck.flash.gz")
+            with gzip.open(compressed_path, "wt") as f:
+                f.write("Math:What is 2 + 2?:4:5\n")
+            table = ConfidenceTable.from_file(compressed_path)
+            assert table.get(b"Math:What is 2 + 2?:4") == "5"
+
+    def test_escape_round_trip(self):
+        """Test that version 2 escaping is exactly reversible"""
+        for field in ["plain", "a:b", "x; y;z", "back\\slash\\c", "two\nlines", ""]:
+            escaped = escape(field)
+            assert ":" not in escaped and ";" not in escaped
+            assert unescape(escaped) == field
+
+    def test_format_and_parse_v2(self):
+        """Test formatting a card as a version 2 line and parsing it back"""
+        card = {
+            "questions": ["Ratio 1:2?", "a;b"],
+            "answers": ["C:\\Windows", "—"],
+            "category": "Maths: ratios",
+        }
+        content = format_content_v2(card)
+        assert content == "Maths\\c ratios:Ratio 1\\c2?;a\\sb:C\\c\\\\Windows;—"
+        assert parse_line_v2(f"{content}:4\n") == (card, "4")
+        assert parse_line_v2("only:three:fields\n") is None
+
+    def test_migrate_to_v2(self):
+        """Test that converting to fla.sh-v2 keeps the confidences of a version 1
+        file and that the result reads back exactly"""
+        ptmem_content = """# Time: units
+
+- Hour?
++ 60 minutes
+
+- Ratio 1:60?
++ minute:hour
+"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            output_path = os.path.join(tmpdir, "deck.flash")
+            with open(input_path, "w") as f:
+                f.write(ptmem_content)
+            with open(output_path, "w") as f:
+                f.write("Time— units:Hour?:60 minutes:3\n")
+                f.write("Time— units:Ratio 1—60?:minute—hour:5\n")
+
+            for _ in range(2):
+                with patch(
+                    "sys.argv",
+                    ["ptmem", input_path, output_path, "-t", "fla.sh-v2"],
+                ):
+                    main()
+                with open(output_path, "r") as f:
+                    assert f.read() == (
+                        "# fla.sh v2\n"
+                        "Time\\c units:Hour?:60 minutes:3\n"
+                        "Time\\c units:Ratio 1\\c60?:minute\\chour:5\n"
+                    )
+
+            assert ConfidenceTable.from_file(output_path).version == 2
+            assert [card["answers"] for card in iter_flash(output_path)] == [
+                ["60 minutes"],
+                ["minute:hour"],
+            ]
+
+    def test_v2_keeps_leading_whitespace_confidence(self):
+        """Test that a version 2 field starting with whitespace keeps its
+        confidence across regenerations"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            output_path = os.path.join(tmpdir, "deck.flash")
+            with open(input_path, "w") as f:
+                f.write("#  Spaced\n\n- Q1\n+ A1\n")
+            with open(output_path, "w") as f:
+                f.write("# fla.sh v2\n Spaced:Q1:A1:5\n")
+
+            table = ConfidenceTable.from_file(output_path)
+            assert table.get(b" Spaced:Q1:A1") == "5"
+            for _ in range(2):
+                with patch(
+                    "sys.argv",
+                    ["ptmem", input_path, output_path, "-t", "fla.sh-v2"],
+                ):
+                    main()
+                with open(output_path, "r") as f:
+                    assert f.read() == "# fla.sh v2\n Spaced:Q1:A1:5\n"
+
+    def test_iter_contents_matches_format_content(self):
+        """Test that the bytes pipeline produces the same content as parsing
+        cards and formatting them"""
+        ptmem_content = (
+            "- No category: yet?\n+ A:1\n\n"
+            "# Units: SI\n"
+            "- Länge?\u00a0\n+ \u2003Meter\n\n"
+            "- Split\rline?\r\n+ Yes\r\n\r\n"
+            "+ Orphan\n\n- Q?\n+ \x1cA\x1c\n"
+            "@ fragment.ptmem\n"
+            "/ comment\nnot a card\n- Last?\n+ —"
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            with open(input_path, "w", newline="") as f:
+                f.write(ptmem_content)
+            with open(os.path.join(tmpdir, "fragment.ptmem"), "w") as f:
+                f.write("- Fragment?\n+ F\n\n# Own: category\n- Other?\n+ O\n")
+
+            expected = [
+                format_content(card).encode()
+                for card in parse_cards(iter_input_lines([input_path]))
+            ]
+            assert list(iter_contents([input_path])) == expected
+            assert len(expected) == 7
+
+    def test_bytes_pipeline_output(self):
+        """Test that fla.sh-only conversion keeps confidences and matches the
+        card-by-card writer"""
+        ptmem_content = """# Math
+
+- What is 2 + 2?
++ 4
+
+- Ratio 1:2?
++ Half
+"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            with open(input_path, "w") as f:
+                f.write(ptmem_content)
+
+            outputs = []
+            # --check takes the card-by-card path
+            for extra in [[], ["--check"]]:
+                output_path = os.path.join(tmpdir, f"deck{len(extra)}.flash")
+                with open(output_path, "w") as f:
+                    f.write("Math:Ratio 1—2?:Half:4\nMath:Gone:x:2\n")
+                with patch(
+                    "sys.argv",
+                    ["ptmem", input_path, output_path, "-t", "fla.sh", *extra],
+                ):
+                    main()
+                with open(output_path) as f:
+                    outputs.append(f.read())
+            assert outputs[0] == "Math:What is 2 + 2?:4:0\nMath:Ratio 1—2?:Half:4\n"
+            assert outputs[0] == outputs[1]
+
+    def test_fuzzy_confidence(self):
+        """Test that lightly edited cards keep the confidence of the card they
+        replace, and only within the same category"""
+        ptmem_content = """# Biology: cells
+- What is the powerhouse of the cell?
++ Mitochondria
+
+- What is the powerhouse of the cell!
++ Mitochondria
+
+- What does the ribosome make?
++ Proteins
+
+# Geography
+- What is the capital of Spain?
++ Madrid
+"""
+        flash_content = (
+            "Biology— cells:What is the powerhouse of the cell?:Mitochondria:4\n"
+            "Biology— cells:What does the ribosome produce?:Proteins:3\n"
+            "History:What is the capital of Spain?:Madrid:5\n"
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            output_path = os.path.join(tmpdir, "deck.flash")
+            with open(input_path, "w") as f:
+                f.write(ptmem_content)
+
+            confidences = []
+            for extra in [[], ["--fuzzy-confidence"], ["--fuzzy-confidence", "0.99"]]:
+                with open(output_path, "w") as f:
+                    f.write(flash_content)
+                with patch(
+                    "sys.argv",
+                    ["ptmem", input_path, output_path, "-t", "fla.sh", *extra],
+                ):
+                    main()
+                with open(output_path) as f:
+                    confidences.append(
+                        [line.rsplit(":", 1)[1] for line in f.read().splitlines()]
+                    )
+            # The exact match keeps its old card, so its near duplicate and the
+            # card from another category start at 0
+            assert confidences == [
+                ["4", "0", "0", "0"],
+                ["4", "0", "3", "0"],
+                ["4", "0", "0", "0"],
+            ]
@@ -0,0 +1,175 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from ptmem.history import (
+    RECORD,
+    ReviewLog,
+    card_hash,
+    compact,
+    content_hash,
+    iter_reviews,
+    load_confidences,
+)
+from ptmem.main import main
+
+
+class TestPTMemHistory:
+    """Test suite for the review history log"""
+
+    def test_card_hash_matches_flash_content(self):
+        """Test that card dicts and fla.sh content hash to the same key"""
+        card = {"questions": ["Q: 1"], "answers": ["A"], "category": "Cat"}
+        assert card_hash(card) == content_hash("Cat:Q— 1:A")
+        assert len(card_hash(card)) == 8
+
+    def test_append_and_load(self):
+        """Test appending reviews and rebuilding current confidences"""
+        first = content_hash("Math:One?:1")
+        second = content_hash("Math:Two?:2")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_path = os.path.join(tmpdir, "reviews.log")
+            with ReviewLog(log_path) as log:
+                log.append(first, 1, 1500, timestamp=100.0)
+                log.append(second, 4, 900, timestamp=101.0)
+                log.append(first, 3, 800, timestamp=102.0)
+            # Reopening appends rather than truncating
+            with ReviewLog(log_path) as log:
+                log.append(second, 2, 700, timestamp=103.0)
+            # Out-of-order records are resolved by timestamp
+            with ReviewLog(log_path) as log:
+                log.append(first, 0, 700, timestamp=50.0)
+
+            reviews = list(iter_reviews(log_path))
+            assert len(reviews) == 5
+            assert reviews[0] == (first, 100.0, 1, 1500)
+            assert load_confidences(log_path) == {first: 3, second: 2}
+
+    def test_truncated_record_ignored(self):
+        """Test that a partial record from an interrupted write is skipped"""
+        card = content_hash("Math:One?:1")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_path = os.path.join(tmpdir, "reviews.log")
+            with ReviewLog(log_path) as log:
+                log.append(card, 5, timestamp=1.0)
+            with open(log_path, "ab") as f:
+                f.write(RECORD.pack(card, 2.0, 1, 0)[:10])
+            assert load_confidences(log_path) == {card: 5}
+
+    def test_append_after_truncated_record(self):
+        """Test that reopening a log with a torn tail keeps new records aligned"""
+        first = content_hash("Math:One?:1")
+        second = content_hash("Math:Two?:2")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_path = os.path.join(tmpdir, "reviews.log")
+            with ReviewLog(log_path) as log:
+                log.append(first, 5, timestamp=1.0)
+            with open(log_path, "ab") as f:
+                f.write(b"xyz")
+            with ReviewLog(log_path) as log:
+                log.append(second, 3, 250, timestamp=2.0)
+
+            assert list(iter_reviews(log_path)) == [
+                (first, 1.0, 5, 0),
+                (second, 2.0, 3, 250),
+            ]
+            assert load_confidences(log_path) == {first: 5, second: 3}
+
+    def test_open_rejects_other_files(self):
+        """Test that appending to a file that is not a review log fails"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_path = os.path.join(tmpdir, "reviews.log")
+            with open(log_path, "wb") as f:
+                f.write(b"not a review log")
+            with pytest.raises(ValueError, match="not a ptmem review log"):
+                ReviewLog(log_path)
+
+    def test_not_a_log(self):
+        """Test that reading a file that is not a review log fails cleanly"""
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b"Math:One?:1:0\n")
+        try:
+            with pytest.raises(ValueError):
+                list(iter_reviews(f.name))
+        finally:
+            os.unlink(f.name)
+
+    def test_compact(self):
+        """Test that compaction keeps the latest reviews per card"""
+        first = content_hash("Math:One?:1")
+        second = content_hash("Math:Two?:2")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_path = os.path.join(tmpdir, "reviews.log")
+            with ReviewLog(log_path) as log:
+                for i in range(5):
+                    log.append(first, i, timestamp=float(i))
+                log.append(second, 7, timestamp=2.5)
+
+            assert compact(log_path, keep=2) == 3
+            assert [(r.card, r.score) for r in iter_reviews(log_path)] == [
+                (second, 7),
+                (first, 3),
+                (first, 4),
+            ]
+
+            with patch("sys.argv", ["ptmem", "compact", log_path]):
+                main()
+            assert load_confidences(log_path) == {first: 4, second: 7}
+            assert len(list(iter_reviews(log_path))) == 2
+
+    def test_compact_out_of_order(self):
+        """Test that compaction keeps the reviews load_confidences considers
+        latest when the log is out of timestamp order"""
+        card = content_hash("Math:One?:1")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_path = os.path.join(tmpdir, "reviews.log")
+            with ReviewLog(log_path) as log:
+                log.append(card, 5, timestamp=200.0)
+                log.append(card, 1, timestamp=100.0)
+                log.append(card, 2, timestamp=150.0)
+            assert load_confidences(log_path) == {card: 5}
+
+            assert compact(log_path, keep=2) == 2
+            assert [r.score for r in iter_reviews(log_path)] == [2, 5]
+            assert compact(log_path) == 1
+            assert load_confidences(log_path) == {card: 5}
+
+    def test_history_overrides_flash_confidence(self):
+        """Test that --history takes fla.sh confidences from the review log"""
+        ptmem_content = """# Math
+
+- One?
++ 1
+
+- Two?
++ 2
+"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            output_path = os.path.join(tmpdir, "deck.flash")
+            log_path = os.path.join(tmpdir, "reviews.log")
+            with open(input_path, "w") as f:
+                f.write(ptmem_content)
+            with open(output_path, "w") as f:
+                f.write("Math:One?:1:1\nMath:Two?:2:2\n")
+            with ReviewLog(log_path) as log:
+                log.append(content_hash("Math:Two?:2"), 5)
+
+            with patch(
+                "sys.argv",
+                [
+                    "ptmem",
+                    input_path,
+                    output_path,
+                    "-t",
+                    "fla.sh",
+                    "--history",
+                    log_path,
+                ],
+            ):
+                main()
+
+            with open(output_path, "r") as f:
+                assert f.read() == "Math:One?:1:1\nMath:Two?:2:5\n"
@@ -276,3 +276,93 @@ class TestPTMemIntegration:
                 finally:
                     os.unlink(utf8_file.name)
                     os.unlink(output_file.name)
+
+    def test_compressed_inputs(self):
+        """Test reading gzip, bz2 and xz inputs, detected by their magic bytes"""
+        import bz2
+        import gzip
+        import lzma
+
+        sample_file = "tests/fixtures/sample.ptmem"
+        expected_file = "tests/fixtures/sample_expected.json"
+        with open(expected_file, "r") as f:
+            expected = json.load(f)
+        with open(sample_file, "rb") as f:
+            sample = f.read()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name, module in [("gz", gzip), ("bz2", bz2), ("xz", lzma)]:
+                # The extension is deliberately not a compression extension
+                input_path = os.path.join(tmpdir, f"sample-{name}.ptmem")
+                output_path = os.path.join(tmpdir, f"sample-{name}.json")
+                with open(input_path, "wb") as f:
+                    f.write(module.compress(sample))
+
+                with patch("sys.argv", ["ptmem", input_path, output_path]):
+                    main()
+
+                with open(output_path, "r") as f:
+                    assert json.load(f) == expected
+
+    def test_input_from_pipe(self):
+        """Test reading plain and compressed inputs from a pipe, which can only
+        be read once"""
+        import gzip
+        import threading
+
+        sample_file = "tests/fixtures/sample.ptmem"
+        expected_file = "tests/fixtures/sample_expected.json"
+        with open(sample_file, "rb") as f:
+            sample = f.read()
+        with open(expected_file, "r") as f:
+            expected = json.load(f)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fifo_path = os.path.join(tmpdir, "deck.ptmem")
+            output_path = os.path.join(tmpdir, "output.json")
+            os.mkfifo(fifo_path)
+            for data in [sample, gzip.compress(sample)]:
+
+                def write_fifo(data=data):
+                    with open(fifo_path, "wb") as f:
+                        f.write(data)
+
+                writer = threading.Thread(target=write_fifo)
+                writer.start()
+                try:
+                    with patch("sys.argv", ["ptmem", fifo_path, output_path]):
+                        main()
+                finally:
+                    writer.join()
+
+                with open(output_path, "r") as f:
+                    assert json.load(f) == expected
+
+    def test_compressed_outputs(self):
+        """Test compressing outputs according to their extension"""
+        import gzip
+        import lzma
+
+        sample_file = "tests/fixtures/sample.ptmem"
+        expected_file = "tests/fixtures/sample_expected.json"
+        with open(expected_file, "r") as f:
+            expected = json.load(f)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            json_path = os.path.join(tmpdir, "sample.json.gz")
+            flash_path = os.path.join(tmpdir, "sample.flash.xz")
+            with lzma.open(flash_path, "wt") as f:
+                f.write("Mathematics:What is 2 + 2?:4:5\n")
+
+            with patch(
+                "sys.argv",
+                ["ptmem", sample_file, json_path, "-o", f"fla.sh={flash_path}"],
+            ):
+                main()
+
+            with gzip.open(json_path, "rt") as f:
+                assert json.load(f) == expected
+            with lzma.open(flash_path, "rt") as f:
+                flash_lines = f.read().splitlines()
+            assert flash_lines[0] == "Mathematics:What is 2 + 2?:4:5"
+            assert len(flash_lines) == len(expected)
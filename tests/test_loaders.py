@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+import tempfile
+
+import pytest
+
+from ptmem.loaders import iter_flash, iter_ndjson, load_json
+
+PTMEM_CONTENT = """# Time: units
+
+- Hour?
++ 60 minutes
+
+- Minute?
+- Min?
++ 60 seconds
++ 1/60 hour
+"""
+
+CARDS = [
+    {"questions": ["Hour?"], "answers": ["60 minutes"], "category": "Time: units"},
+    {
+        "questions": ["Minute?", "Min?"],
+        "answers": ["60 seconds", "1/60 hour"],
+        "category": "Time: units",
+    },
+]
+
+
+class TestPTMemLoaders:
+    """Test suite for reading outputs back into cards"""
+
+    def test_json_and_ndjson_round_trip(self, convert):
+        """Test that json and ndjson outputs load back into the same cards"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            json_path = os.path.join(tmpdir, "deck.json")
+            ndjson_path = os.path.join(tmpdir, "deck.ndjson.gz")
+            with open(input_path, "w") as f:
+                f.write(PTMEM_CONTENT)
+            convert(input_path, json_path, "-o", f"ndjson={ndjson_path}")
+
+            assert load_json(json_path) == CARDS
+            assert list(iter_ndjson(ndjson_path)) == CARDS
+
+    def test_flash_loader(self):
+        """Test that fla.sh lines load with their confidence and colons restored"""
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".flash", delete=False) as f:
+            f.write("Time— units:Hour?:60 minutes:3\n\nnot a card\n")
+            f.write("Time— units:Minute?; Min?:60 seconds; 1/60 hour:0\n")
+        try:
+            cards = list(iter_flash(f.name))
+            assert cards == [
+                {**CARDS[0], "confidence": "3"},
+                {**CARDS[1], "confidence": "0"},
+            ]
+            raw = next(iter_flash(f.name, restore_colons=False))
+            assert raw["category"] == "Time— units"
+        finally:
+            os.unlink(f.name)
+
+    def test_reexport_flash_keeps_confidence(self, convert):
+        """Test converting a fla.sh file to a new fla.sh and json output"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            flash_path = os.path.join(tmpdir, "old.flash")
+            new_path = os.path.join(tmpdir, "new.flash.gz")
+            json_path = os.path.join(tmpdir, "deck.json")
+            flash_content = (
+                "Time— units:Hour?:60 minutes:3\n"
+                "Time— units:Minute?; Min?:60 seconds; 1/60 hour:1\n"
+            )
+            with open(flash_path, "w") as f:
+                f.write(flash_content)
+
+            convert("-i", "fla.sh", flash_path, new_path, "-t", "fla.sh")
+            convert("-i", "fla.sh", new_path, json_path)
+
+            with gzip.open(new_path, "rt") as f:
+                assert f.read() == flash_content
+            with open(json_path) as f:
+                assert [card["confidence"] for card in json.load(f)] == ["3", "1"]
+
+    def test_loaded_input_rejects_check(self, convert):
+        """Test that ptmem-only options are rejected for other input types"""
+        with pytest.raises(SystemExit) as excinfo:
+            convert("-i", "json", "in.json", "out.flash", "--check")
+        assert excinfo.value.code == 2
@@ -1,9 +1,14 @@
+import csv
 import json
 import tempfile
 import os
 from io import StringIO
 from unittest.mock import patch
+
+import pytest
+
 from ptmem.main import main
+from ptmem.parser import PtmemParser, SourceMap, parse_cards
 
 
 class TestPTMemParser:
@@ -634,3 +639,396 @@ Math:What is 3 + 3?:6:2
                 finally:
                     os.unlink(input_file.name)
                     os.unlink(output_file.name)
+
+    def test_with_source_locations(self):
+        """Test that --with-source records the file and line each card starts on"""
+        first_content = """# Math
+
+/ comment
+- What is 2 + 2?
++ 4
+
+- What is 3 + 3?
++ 6
+"""
+        second_content = """
+- What is 4 + 4?
++ 8
+"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            first = os.path.join(tmpdir, "first.ptmem")
+            second = os.path.join(tmpdir, "second.ptmem")
+            output = os.path.join(tmpdir, "out.json")
+            with open(first, "w") as f:
+                f.write(first_content)
+            with open(second, "w") as f:
+                f.write(second_content)
+
+            with patch("sys.argv", ["ptmem", first, second, output, "--with-source"]):
+                main()
+
+            with open(output, "r") as f:
+                result = json.load(f)
+
+            assert [card["source"] for card in result] == [
+                {"file": first, "line": 4},
+                {"file": first, "line": 7},
+                {"file": second, "line": 2},
+            ]
+            assert result[2]["category"] == "Math"
+
+    def test_source_map_storage(self):
+        """Test that the source map stores line numbers in compact arrays"""
+        from array import array
+
+        from ptmem.parser import SourceMap, parse_cards
+
+        lines = [
+            ("a.ptmem", 1, "- Q1\n"),
+            ("a.ptmem", 2, "+ A1\n"),
+            ("a.ptmem", 3, "\n"),
+            ("a.ptmem", 4, "- Q2\n"),
+            ("b.ptmem", 1, "\n"),
+            ("b.ptmem", 2, "- Q3\n"),
+        ]
+        source_map = SourceMap()
+        cards = list(parse_cards(lines, source_map=source_map))
+
+        assert len(cards) == len(source_map) == 3
+        assert source_map.files == ["a.ptmem", "b.ptmem"]
+        assert source_map.lines == [array("I", [1, 4]), array("I", [2])]
+        assert list(source_map) == [("a.ptmem", 1), ("a.ptmem", 4), ("b.ptmem", 2)]
+
+    def test_tsv_output_format(self):
+        """Test tab-separated output with the default joiners"""
+        ptmem_content = """# Science
+
+- What are the primary colors?
+- Name the primary colors
++ Red
++ Blue
++ Yellow
+
+- Tab question?
++ Tab\there
+"""
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".ptmem", delete=False
+        ) as input_file:
+            input_file.write(ptmem_content)
+            input_file.flush()
+
+            with tempfile.NamedTemporaryFile(
+                mode="w", suffix=".tsv", delete=False
+            ) as output_file:
+                try:
+                    with patch(
+                        "sys.argv",
+                        ["ptmem", input_file.name, output_file.name, "-t", "tsv"],
+                    ):
+                        main()
+
+                    with open(output_file.name, "r", newline="") as f:
+                        rows = list(csv.reader(f, dialect="excel-tab"))
+
+                    assert rows == [
+                        [
+                            "What are the primary colors?; Name the primary colors",
+                            "Red; Blue; Yellow",
+                            "Science",
+                        ],
+                        ["Tab question?", "Tab\there", "Science"],
+                    ]
+                finally:
+                    os.unlink(input_file.name)
+                    os.unlink(output_file.name)
+
+    def test_csv_output_custom_joiners(self):
+        """Test comma-separated output with custom question and answer joiners"""
+        ptmem_content = """- Q1, part one
+- Q1 again
++ A1
++ A2
+"""
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".ptmem", delete=False
+        ) as input_file:
+            input_file.write(ptmem_content)
+            input_file.flush()
+
+            with tempfile.NamedTemporaryFile(
+                mode="w", suffix=".csv", delete=False
+            ) as output_file:
+                try:
+                    with patch(
+                        "sys.argv",
+                        [
+                            "ptmem",
+                            input_file.name,
+                            output_file.name,
+                            "-t",
+                            "csv",
+                            "--question-joiner",
+                            " / ",
+                            "--answer-joiner",
+                            "<br>",
+                        ],
+                    ):
+                        main()
+
+                    with open(output_file.name, "r", newline="") as f:
+                        content = f.read()
+
+                    assert content == '"Q1, part one / Q1 again",A1<br>A2,\r\n'
+                finally:
+                    os.unlink(input_file.name)
+                    os.unlink(output_file.name)
+
+    def test_include_fragments(self):
+        """Test that @ lines insert fragment cards with inherited categories"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.mkdir(os.path.join(tmpdir, "shared"))
+            fragment = os.path.join(tmpdir, "shared", "units.ptmem")
+            nested = os.path.join(tmpdir, "shared", "nested.ptmem")
+            deck = os.path.join(tmpdir, "deck.ptmem")
+            output = os.path.join(tmpdir, "deck.json")
+            with open(nested, "w") as f:
+                f.write("# Nested\n\n- Nested question?\n+ Nested answer\n")
+            with open(fragment, "w") as f:
+                f.write("- Unit of force?\n+ Newton\n@ nested.ptmem\n")
+            with open(deck, "w") as f:
+                f.write(
+                    "# Physics\n\n- First?\n+ 1\n@ shared/units.ptmem\n\n- Last?\n+ 2\n"
+                )
+
+            with patch("sys.argv", ["ptmem", deck, output, "--with-source"]):
+                main()
+
+            with open(output, "r") as f:
+                result = json.load(f)
+
+            assert [
+                (card["questions"][0], card["category"], card["source"])
+                for card in result
+            ] == [
+                ("First?", "Physics", {"file": deck, "line": 3}),
+                ("Unit of force?", "Physics", {"file": fragment, "line": 1}),
+                ("Nested question?", "Nested", {"file": nested, "line": 3}),
+                ("Last?", "Physics", {"file": deck, "line": 7}),
+            ]
+
+    def test_include_parsed_once(self):
+        """Test that a fragment included from several decks is parsed once"""
+        from ptmem.parser import Includes, iter_input_lines, parse_cards
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fragment = os.path.join(tmpdir, "fragment.ptmem")
+            decks = [os.path.join(tmpdir, f"deck{i}.ptmem") for i in range(3)]
+            with open(fragment, "w") as f:
+                f.write("- Shared?\n+ Yes\n")
+            for deck in decks:
+                with open(deck, "w") as f:
+                    f.write("@ fragment.ptmem\n")
+
+            includes = Includes()
+            with patch(
+                "ptmem.parser.iter_input_lines", wraps=iter_input_lines
+            ) as mock_iter:
+                cards = list(parse_cards(iter_input_lines(decks), includes=includes))
+
+            assert len(cards) == 3
+            assert mock_iter.call_count == 1
+            assert includes.paths == [os.path.realpath(fragment)]
+
+    def test_include_cycle(self, capsys):
+        """Test that include cycles are reported instead of recursing forever"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            first = os.path.join(tmpdir, "first.ptmem")
+            second = os.path.join(tmpdir, "second.ptmem")
+            output = os.path.join(tmpdir, "out.json")
+            with open(first, "w") as f:
+                f.write("@ second.ptmem\n")
+            with open(second, "w") as f:
+                f.write("- Q?\n+ A\n\n@ first.ptmem\n")
+
+            with patch("sys.argv", ["ptmem", first, output]):
+                with pytest.raises(SystemExit) as excinfo:
+                    main()
+
+            assert excinfo.value.code == 1
+            assert "include cycle" in capsys.readouterr().err
+            assert not os.path.exists(output)
+
+    def test_include_missing_file(self, capsys):
+        """Test that an include of a missing file is reported with its location"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            deck = os.path.join(tmpdir, "deck.ptmem")
+            output = os.path.join(tmpdir, "out.json")
+            with open(deck, "w") as f:
+                f.write("- Q?\n+ A\n\n@ missing.ptmem\n")
+
+            for output_type in ["json", "fla.sh"]:
+                with patch("sys.argv", ["ptmem", deck, output, "-t", output_type]):
+                    with pytest.raises(SystemExit) as excinfo:
+                        main()
+
+                assert excinfo.value.code == 1
+                err = capsys.readouterr().err
+                assert err.startswith(f"ptmem: {deck}:4: cannot include ")
+                assert "missing.ptmem: No such file or directory" in err
+                assert not os.path.exists(output)
+
+    @pytest.mark.parametrize("command", ["index", "similar", "categories", "diff"])
+    def test_include_errors_in_subcommands(self, command, capsys):
+        """Test that subcommands report include errors instead of crashing"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            deck = os.path.join(tmpdir, "deck.ptmem")
+            with open(deck, "w") as f:
+                f.write("- Q?\n+ A\n\n@ missing.ptmem\n")
+            argv = {
+                "index": [deck, os.path.join(tmpdir, "deck.idx")],
+                "similar": [deck],
+                "categories": [deck],
+                "diff": [deck, deck],
+            }[command]
+
+            with patch("sys.argv", ["ptmem", command, *argv]):
+                with pytest.raises(SystemExit) as excinfo:
+                    main()
+
+            assert excinfo.value.code == 1
+            assert capsys.readouterr().err.startswith(
+                f"ptmem: {deck}:4: cannot include "
+            )
+
+    def test_ndjson_output_format(self):
+        """Test one compact JSON object per card, per line"""
+        ptmem_content = """# Science
+
+- What is H2O?
++ Water
+
+- Ünïcödé?
++ Yes
+"""
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".ptmem", delete=False
+        ) as input_file:
+            input_file.write(ptmem_content)
+            input_file.flush()
+
+            with tempfile.NamedTemporaryFile(
+                mode="w", suffix=".ndjson", delete=False
+            ) as output_file:
+                try:
+                    with patch(
+                        "sys.argv",
+                        ["ptmem", input_file.name, output_file.name, "-t", "ndjson"],
+                    ):
+                        main()
+
+                    with open(output_file.name, "r") as f:
+                        lines = f.read().splitlines()
+
+                    assert lines[0] == (
+                        '{"questions":["What is H2O?"],"answers":["Water"],'
+                        '"category":"Science"}'
+                    )
+                    assert [json.loads(line) for line in lines] == [
+                        {
+                            "questions": ["What is H2O?"],
+                            "answers": ["Water"],
+                            "category": "Science",
+                        },
+                        {
+                            "questions": ["Ünïcödé?"],
+                            "answers": ["Yes"],
+                            "category": "Science",
+                        },
+                    ]
+                finally:
+                    os.unlink(input_file.name)
+                    os.unlink(output_file.name)
+
+    def test_output_to_stdout(self, capsys):
+        """Test writing output to stdout with -"""
+        ptmem_content = """# Test
+
+- Q?
++ A
+"""
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".ptmem", delete=False
+        ) as input_file:
+            input_file.write(ptmem_content)
+            input_file.flush()
+
+            try:
+                with patch("sys.argv", ["ptmem", input_file.name, "-", "-t", "ndjson"]):
+                    main()
+
+                assert capsys.readouterr().out == (
+                    '{"questions":["Q?"],"answers":["A"],"category":"Test"}\n'
+                )
+            finally:
+                os.unlink(input_file.name)
+
+    def test_incremental_parser(self):
+        """Test feeding the parser chunks split mid-line and mid-character"""
+        ptmem_content = """# Größen
+
+- Länge?
++ Meter
+
++ Orphan answer
+- Zeit?\r
++ Sekunde\r
+
+# Other
+- Unfinished?
++ Last"""
+        lines = [
+            ("<stream>", n, line)
+            for n, line in enumerate(ptmem_content.splitlines(keepends=True), 1)
+        ]
+        expected_map = SourceMap()
+        expected = list(parse_cards(lines, source_map=expected_map))
+        data = ptmem_content.encode()
+
+        for chunk_size in [1, 2, 3, 7, len(data)]:
+            source_map = SourceMap()
+            parser = PtmemParser(source_map=source_map)
+            cards = []
+            for i in range(0, len(data), chunk_size):
+                cards += parser.feed(data[i : i + chunk_size])
+            assert len(cards) == 2
+            cards += parser.close()
+            assert cards == expected
+            assert list(source_map) == list(expected_map)
+
+        # Lone carriage returns end lines, as in text mode, and a \r\n split
+        # across chunks is a single line ending
+        for data in [
+            "- Q1\r+ A1\r\r- Q2\r+ A2\r",
+            b"- Q1\r\n+ A1\r\n\r\n- Q2\r\n+ A2",
+        ]:
+            for chunk_size in [1, 2, len(data)]:
+                parser = PtmemParser()
+                cards = []
+                for i in range(0, len(data), chunk_size):
+                    cards += parser.feed(data[i : i + chunk_size])
+                cards += parser.close()
+                assert cards == [
+                    {"questions": ["Q1"], "answers": ["A1"], "category": None},
+                    {"questions": ["Q2"], "answers": ["A2"], "category": None},
+                ]
+                assert parser.lineno == 5
+
+        parser = PtmemParser()
+        assert parser.feed("- Q?\n+ A\n") == []
+        assert parser.feed("\n") == [
+            {"questions": ["Q?"], "answers": ["A"], "category": None}
+        ]
+        assert parser.close() == []
+        with pytest.raises(ValueError):
+            parser.feed("- Q?\n")
@@ -0,0 +1,188 @@
+import gzip
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from ptmem.main import main
+from ptmem.parallel import parse_parallel, split_chunks
+from ptmem.parser import Includes, SourceMap, iter_input_lines, parse_cards
+
+FRAGMENT_CONTENT = """- Fragment question?
++ Fragment answer
+
+- Fragment question without an answer?
+
+# Fragment category
+- Categorized?
++ Yes
+"""
+
+
+def make_deck(cards=400):
+    """Build a deck that exercises every kind of line the parser handles."""
+    lines = []
+    for i in range(cards):
+        if i % 37 == 0:
+            lines.append(f"# Category {i}")
+        if i % 53 == 0:
+            lines.append("@ fragment.ptmem")
+        if i % 41 == 0:
+            lines.append(f"+ Orphan answer {i}")
+            lines.append("")
+        if i % 29 == 0:
+            lines.append("not a card line")
+        if i % 31 == 0:
+            lines.append(f"/ Comment {i}")
+        lines.append(f"- Question {i}?")
+        if i % 17:
+            lines.append(f"+ Answer {i}")
+        lines.append("   " if i % 7 == 0 else "")
+    return "\n".join(lines) + "\n"
+
+
+def write_inputs(tmpdir):
+    """Write a fragment and several inputs whose cards and categories run
+    across file boundaries, and return the input paths."""
+    with open(os.path.join(tmpdir, "fragment.ptmem"), "w") as f:
+        f.write(FRAGMENT_CONTENT)
+    paths = [os.path.join(tmpdir, "deck.ptmem")]
+    with open(paths[0], "w") as f:
+        f.write(make_deck())
+    # No trailing newline: the last card continues into the next file
+    paths.append(os.path.join(tmpdir, "open.ptmem"))
+    with open(paths[1], "w") as f:
+        f.write("- Continued?\n+ Yes")
+    paths.append(os.path.join(tmpdir, "compressed.ptmem.gz"))
+    with gzip.open(paths[2], "wt") as f:
+        f.write("- More questions?\n+ More\n\n" + make_deck(50))
+    # The same file twice, and a file that is also included as a fragment
+    paths += [paths[0], os.path.join(tmpdir, "fragment.ptmem")]
+    return paths
+
+
+class TestPTMemParallel:
+    """Test suite for chunked parallel parsing"""
+
+    @pytest.mark.parametrize("threads", [False, True])
+    def test_matches_sequential_parse(self, threads):
+        """Test that chunked parsing yields the same cards, sources and
+        diagnostics as the sequential parser"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = write_inputs(tmpdir)
+            expected_diagnostics = []
+            expected_map = SourceMap()
+            expected_includes = Includes()
+            expected = list(
+                parse_cards(
+                    iter_input_lines(paths),
+                    on_diagnostic=expected_diagnostics.append,
+                    source_map=expected_map,
+                    includes=expected_includes,
+                )
+            )
+
+            # Run the thread pool even under the GIL
+            with patch("ptmem.parallel.gil_enabled", return_value=False):
+                for chunk_size in [100, 1000, 10**9]:
+                    diagnostics = []
+                    source_map = SourceMap()
+                    includes = Includes()
+                    cards = list(
+                        parse_parallel(
+                            paths,
+                            3,
+                            on_diagnostic=diagnostics.append,
+                            source_map=source_map,
+                            chunk_size=chunk_size,
+                            threads=threads,
+                            includes=includes,
+                        )
+                    )
+                    assert cards == expected
+                    assert diagnostics == expected_diagnostics
+                    assert list(source_map) == list(expected_map)
+                    # Fragments are recorded, not parsed again, in the parent
+                    assert includes.paths == expected_includes.paths
+                    assert includes.cache == {}
+
+    def test_unicode_whitespace_blank_line(self):
+        """Test that a line of Unicode whitespace ends a card in chunked
+        parsing as it does in the sequential parser"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "deck.ptmem")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("# C\n- Q1\n+ A1\n\u00a0\n+ orphan\n\n- Q2\n+ A2\n")
+            expected_diagnostics = []
+            expected = list(
+                parse_cards(
+                    iter_input_lines([path]),
+                    on_diagnostic=expected_diagnostics.append,
+                )
+            )
+            assert expected[1]["answers"] == ["orphan", "A2"]
+
+            diagnostics = []
+            cards = list(
+                parse_parallel(
+                    [path], 2, on_diagnostic=diagnostics.append, chunk_size=1
+                )
+            )
+            assert cards == expected
+            assert diagnostics == expected_diagnostics
+
+    def test_split_chunks(self):
+        """Test that chunks cover the input and end after completed cards"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = write_inputs(tmpdir)
+            chunks = split_chunks(paths, 4, chunk_size=200)
+            assert len(chunks) > 4
+
+            segments = [segment for chunk in chunks for segment in chunk]
+            for path in set(paths):
+                with open(path, "rb") as f:
+                    content = f.read()
+                if path.endswith(".gz"):
+                    assert [s.end for s in segments if s.path == path] == [None]
+                    continue
+                ranges = [(s.start, s.end) for s in segments if s.index == 0]
+                if path == paths[0]:
+                    assert ranges[0][0] == 0 and ranges[-1][1] == len(content)
+                    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+            for chunk in chunks[:-1]:
+                last = chunk[-1]
+                with open(last.path, "rb") as f:
+                    content = f.read()
+                last_lines = content[: last.end].splitlines()[-2:]
+                assert last_lines[1].strip() == b""
+                assert last_lines[0].startswith((b"- ", b"+ "))
+
+    @pytest.mark.parametrize("workers", ["process", "thread"])
+    def test_jobs_output_identical(self, workers):
+        """Test that --jobs writes the same output as a sequential run"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = write_inputs(tmpdir)
+            outputs = []
+            for jobs in ["1", "4"]:
+                output_path = os.path.join(tmpdir, f"deck{jobs}.json")
+                with (
+                    patch("ptmem.parallel.CHUNK_SIZE", 500),
+                    patch("ptmem.parallel.gil_enabled", return_value=False),
+                    patch(
+                        "sys.argv",
+                        ["ptmem", *paths, output_path, "-j", jobs, "--with-source"]
+                        + ["--workers", workers],
+                    ),
+                ):
+                    main()
+                with open(output_path) as f:
+                    outputs.append(f.read())
+            assert outputs[0] == outputs[1]
+
+    def test_jobs_rejects_stdin(self):
+        """Test that --jobs cannot read from stdin"""
+        with patch("sys.argv", ["ptmem", "-", "out.json", "-j", "2"]):
+            with pytest.raises(SystemExit) as excinfo:
+                main()
+            assert excinfo.value.code == 2
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+from collections import Counter
+from unittest.mock import patch
+
+import pytest
+
+from ptmem.main import main
+from ptmem.sample import external_shuffle, reservoir_sample
+
+
+def make_cards(count):
+    return [
+        {"questions": [f"Q{i}?"], "answers": [f"A{i}"], "category": f"C{i % 3}"}
+        for i in range(count)
+    ]
+
+
+def write_deck(path, count):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(f"- Q{i}?\n+ A{i}\n\n")
+
+
+class TestPTMemSample:
+    """Test suite for random sampling and shuffling"""
+
+    def test_reservoir_sample(self):
+        """Test that samples keep deck order, repeat with a seed and pick every
+        card about equally often"""
+        cards = make_cards(50)
+        sample = reservoir_sample(iter(cards), 10, seed=1)
+        assert len(sample) == 10
+        assert sample == sorted(sample, key=cards.index)
+        assert reservoir_sample(iter(cards), 10, seed=1) == sample
+        assert reservoir_sample(iter(cards), 100) == cards
+        assert reservoir_sample(iter(cards), 0) == []
+
+        picks = Counter()
+        for seed in range(2000):
+            for card in reservoir_sample(cards, 5, seed=seed):
+                picks[card["questions"][0]] += 1
+        # Each card is expected 200 times
+        assert len(picks) == 50
+        assert all(140 < count < 260 for count in picks.values())
+
+    @pytest.mark.parametrize("run_size", [1000, 4])
+    def test_external_shuffle(self, run_size):
+        """Test that shuffling, in memory or through spilled buckets, gives a
+        repeatable permutation with every position equally likely"""
+        cards = make_cards(300)
+        shuffled = list(external_shuffle(iter(cards), seed=7, run_size=run_size))
+        assert shuffled != cards
+        assert sorted(shuffled, key=cards.index) == cards
+        assert list(external_shuffle(cards, seed=7, run_size=run_size)) == shuffled
+
+        # Each of 4 cards should come first about 100 times in 400 shuffles;
+        # few buckets keep the spilling cheap
+        with patch("ptmem.sample.BUCKETS", 4):
+            firsts = Counter(
+                next(external_shuffle(make_cards(4), seed, run_size))["questions"][0]
+                for seed in range(400)
+            )
+        assert len(firsts) == 4
+        assert all(60 < count < 140 for count in firsts.values())
+
+    def test_sample_command(self):
+        """Test ptmem sample and --shuffle on a conversion"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            write_deck(input_path, 100)
+            outputs = []
+            for argv in [
+                ["sample", input_path, "out.json", "-n", "10", "--seed", "3"],
+                ["sample", input_path, "out.json", "-n", "10", "--seed", "3"],
+                [
+                    "sample",
+                    input_path,
+                    "out.json",
+                    "-n",
+                    "10",
+                    "--seed",
+                    "3",
+                    "--shuffle",
+                ],
+                [
+                    input_path,
+                    "out.json",
+                    "--shuffle",
+                    "--seed",
+                    "3",
+                    "--sort-run-size",
+                    "7",
+                ],
+            ]:
+                output_path = os.path.join(tmpdir, "out.json")
+                argv = [output_path if arg == "out.json" else arg for arg in argv]
+                with patch("sys.argv", ["ptmem", *argv]):
+                    main()
+                with open(output_path) as f:
+                    outputs.append([card["questions"][0] for card in json.load(f)])
+            assert len(outputs[0]) == 10
+            assert outputs[1] == outputs[0]
+            assert sorted(outputs[2]) == sorted(outputs[0])
+            assert sorted(outputs[3]) == sorted(f"Q{i}?" for i in range(100))
+            assert outputs[3] != [f"Q{i}?" for i in range(100)]
+
+    def test_shuffle_rejects_sort_by(self):
+        """Test that --shuffle and --sort-by cannot be combined"""
+        with patch(
+            "sys.argv",
+            ["ptmem", "in.ptmem", "out.json", "--shuffle", "--sort-by", "category"],
+        ):
+            with pytest.raises(SystemExit) as excinfo:
+                main()
+            assert excinfo.value.code == 2
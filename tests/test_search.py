@@ -0,0 +1,108 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from ptmem.main import main
+from ptmem.search import SearchIndex, build_index, tokenize
+
+
+class TestPTMemSearch:
+    """Test suite for the ptmem index and search commands"""
+
+    def test_tokenize(self):
+        """Test that tokens are lowercase words without punctuation"""
+        assert tokenize("What is H2O? It's water!") == [
+            "what",
+            "is",
+            "h2o",
+            "it",
+            "s",
+            "water",
+        ]
+
+    def test_index_and_search(self):
+        """Test keyword, prefix and multi-word queries against a built index"""
+        cards = [
+            {"questions": ["What is mitosis?"], "answers": ["Cell division"]},
+            {"questions": ["What is meiosis?"], "answers": ["Division for gametes"]},
+            {"questions": ["Powerhouse of the cell?"], "answers": ["Mitochondria"]},
+        ]
+        for card in cards:
+            card["category"] = "Biology"
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            index_path = os.path.join(tmpdir, "deck.idx")
+            assert build_index(iter(cards), index_path) == 3
+
+            with SearchIndex(index_path) as index:
+                assert len(index) == 3
+                assert index.search("division") == [0, 1]
+                assert index.search("CELL division") == [0]
+                assert index.search("mito*") == [0, 2]
+                assert index.search("what mito*") == [0]
+                assert index.search("nothing") == []
+                assert index.search("") == []
+                assert index.card(2) == cards[2]
+
+    def test_postings_with_large_gaps(self):
+        """Test that postings survive delta encoding with wide gaps"""
+        cards = [
+            {
+                "questions": ["rare" if i in (0, 70000, 70001) else "common"],
+                "answers": [],
+                "category": None,
+            }
+            for i in range(70002)
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            index_path = os.path.join(tmpdir, "deck.idx")
+            build_index(iter(cards), index_path)
+
+            with SearchIndex(index_path) as index:
+                assert index.search("rare") == [0, 70000, 70001]
+                assert len(index.search("common")) == 69999
+
+    def test_not_an_index(self):
+        """Test that opening a file that is not an index fails cleanly"""
+        with tempfile.NamedTemporaryFile(suffix=".idx", delete=False) as f:
+            f.write(b"# Not an index\n" * 10)
+        try:
+            with pytest.raises(ValueError):
+                SearchIndex(f.name)
+        finally:
+            os.unlink(f.name)
+
+    def test_search_command_output(self, capsys):
+        """Test the index and search commands end to end"""
+        ptmem_content = """# Science
+
+- What gas do plants absorb?
++ Carbon dioxide
++ CO2
+
+- What is the chemical symbol for water?
++ H2O
+"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            index_path = os.path.join(tmpdir, "deck.idx")
+            with open(input_path, "w") as f:
+                f.write(ptmem_content)
+
+            with patch("sys.argv", ["ptmem", "index", input_path, index_path]):
+                main()
+            assert capsys.readouterr().err == "Indexed 2 cards\n"
+
+            with patch("sys.argv", ["ptmem", "search", index_path, "carb*"]):
+                main()
+            assert capsys.readouterr().out == (
+                f"{input_path}:3: What gas do plants absorb? -> Carbon dioxide; CO2\n"
+            )
+
+            with patch("sys.argv", ["ptmem", "search", index_path, "helium"]):
+                with pytest.raises(SystemExit) as excinfo:
+                    main()
+            assert excinfo.value.code == 1
+            assert capsys.readouterr().out == ""
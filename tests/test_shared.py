@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import tempfile
+
+import pytest
+
+from ptmem.categories import CategoryTrie
+from ptmem.parser import iter_input_lines, parse_cards
+from ptmem.shared import SharedDeck, publish
+
+PTMEM_CONTENT = """- No category?
++ None
+
+# Biology: cells
+- What is the powerhouse of the cell?
+- Mitochondria?
++ Mitochondria
++ Die Kraftwerke der Zelle ⚡
+
+- Empty answer list?
+"""
+
+
+def read_deck(name, queue):
+    with SharedDeck.attach(name) as deck:
+        queue.put([dict(card) for card in deck])
+
+
+class TestPTMemShared:
+    """Test suite for decks published in shared memory"""
+
+    def test_publish_and_read_back(self):
+        """Test that card views equal the published cards, extra fields
+        included, and that the deck is read-only"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            with open(input_path, "w") as f:
+                f.write(PTMEM_CONTENT)
+            cards = list(parse_cards(iter_input_lines([input_path])))
+        cards[0]["confidence"] = "3"
+        cards[1]["source"] = {"file": "deck.ptmem", "line": 4}
+        cards.append({"questions": [], "answers": [], "category": ""})
+
+        with publish(iter(cards)) as deck:
+            assert len(deck) == 4
+            assert list(deck) == cards
+            assert deck[-1]["category"] == ""
+            assert deck[1]["answers"][1] == "Die Kraftwerke der Zelle ⚡"
+            assert deck[0]["confidence"] == "3"
+            assert [dict(card) for card in deck[1:]] == cards[1:]
+            # The category of two cards is stored once: 9 texts, 2 extras
+            assert deck.string_count == 11
+            with pytest.raises(TypeError):
+                deck.buf[0] = 0
+            with pytest.raises(IndexError):
+                deck[4]
+
+            with SharedDeck.attach(deck.name) as attached:
+                assert list(attached) == cards
+                with pytest.raises(PermissionError):
+                    attached.unlink()
+
+    def test_select_by_category(self):
+        """Test selecting the cards of a category subtree from a deck published
+        with its category trie"""
+        categories = ["Biology", "Biology/Cells", "Physics", "Biology/Cells", None]
+        cards = [
+            {"questions": [f"Q{i}?"], "answers": [f"A{i}"], "category": category}
+            for i, category in enumerate(categories)
+        ]
+        trie = CategoryTrie()
+        with publish(trie.index(cards)) as deck:
+            assert deck.select(trie, "Biology/**") == [cards[0], cards[1], cards[3]]
+            assert [view.index for view in deck.select(trie, "*/Cells")] == [1, 3]
+            assert deck.select(trie, "Chemistry/**") == []
+            with pytest.raises(ValueError):
+                deck.select(CategoryTrie(), "**")
+
+    def test_attach_from_other_process(self):
+        """Test that a worker process reads the same cards"""
+        cards = [
+            {"questions": [f"Q{i}?"], "answers": [f"A{i}"], "category": "C"}
+            for i in range(1000)
+        ]
+        with publish(cards) as deck:
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=read_deck, args=(deck.name, queue))
+            process.start()
+            assert queue.get(timeout=30) == cards
+            process.join()
+            assert process.exitcode == 0
+
+    def test_attach_rejects_other_blocks(self):
+        """Test that a shared memory block without a deck is rejected"""
+        from multiprocessing import shared_memory
+
+        shm = shared_memory.SharedMemory(create=True, size=128)
+        try:
+            with pytest.raises(ValueError):
+                SharedDeck.attach(shm.name)
+        finally:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from ptmem.main import main
+from ptmem.similar import (
+    choose_bands,
+    estimate_similarity,
+    find_similar,
+    match_similar,
+    normalize,
+    shingles,
+    signature,
+)
+
+
+def make_card(question, answer):
+    return {"questions": [question], "answers": [answer], "category": None}
+
+
+class TestPTMemSimilar:
+    """Test suite for near-duplicate card detection"""
+
+    def test_normalize_ignores_punctuation(self):
+        """Test that punctuation, case and spacing are normalized away"""
+        assert normalize(make_card("What's  the capital?", "Paris.")) == (
+            "what s the capital paris"
+        )
+
+    def test_identical_text_has_identical_signature(self):
+        """Test that cards differing only in punctuation get equal signatures"""
+        a = signature(shingles(make_card("What is DNA?", "A molecule")))
+        b = signature(shingles(make_card("what is DNA", "A molecule!")))
+        assert estimate_similarity(a, b) == 1.0
+
+    def test_match_similar(self):
+        """Test that edited cards are paired one to one with their originals
+        in the same category only"""
+        old = [
+            make_card("What is the powerhouse of the cell?", "Mitochondria"),
+            make_card("What is the capital of France?", "Paris"),
+            {**make_card("What is the capital of Spain?", "Madrid"), "category": "X"},
+        ]
+        new = [
+            make_card("What is the capital of Spain?", "Madrid"),
+            make_card("What is the capitol of France?", "Paris"),
+            make_card("What is the capital of France??", "Paris"),
+            make_card("What is the powerhouse of the cell?", "The mitochondria"),
+        ]
+        assert match_similar(old, new) == {2: 1, 3: 0}
+
+    def test_choose_bands(self):
+        """Test that the LSH threshold does not exceed the requested one"""
+        for threshold in [0.3, 0.5, 0.7, 0.9]:
+            bands, rows = choose_bands(threshold)
+            assert bands * rows == 64
+            assert (1 / bands) ** (1 / rows) <= threshold
+
+    def test_find_similar_clusters(self):
+        """Test that near duplicates cluster and unrelated cards do not"""
+        cards = [
+            make_card("What is the capital of France?", "Paris"),
+            make_card("Who wrote Hamlet?", "William Shakespeare"),
+            make_card("What's the capital of France", "Paris."),
+            make_card("What is the capital city of France?", "Paris"),
+            make_card("Who painted the Mona Lisa?", "Leonardo da Vinci"),
+            make_card("Who wrote 'Hamlet'?", "William Shakespeare"),
+            {"questions": ["?"], "answers": [], "category": None},
+        ]
+        assert find_similar(iter(cards), threshold=0.6) == [[0, 2, 3], [1, 5]]
+
+    def test_similar_command_output(self, capsys):
+        """Test the similar command end to end"""
+        ptmem_content = """# Geography
+
+- What is the capital of France?
++ Paris
+
+- What is the capital of Spain?
++ Madrid
+
+- What's the capital of France
++ Paris.
+"""
+        with tempfile.NamedTemporaryFile(
+            mode="w", suffix=".ptmem", delete=False
+        ) as input_file:
+            input_file.write(ptmem_content)
+            input_file.flush()
+
+            try:
+                with patch("sys.argv", ["ptmem", "similar", input_file.name]):
+                    main()
+
+                assert capsys.readouterr().out == (
+                    f"{input_file.name}:3: What is the capital of France?\n"
+                    f"{input_file.name}:9: What's the capital of France\n"
+                )
+            finally:
+                os.unlink(input_file.name)
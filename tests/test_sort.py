@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from ptmem.main import main
+from ptmem.sort import category_key, external_sort, question_key
+
+
+def make_card(question, category):
+    return {"questions": [question], "answers": ["A"], "category": category}
+
+
+class TestPTMemSort:
+    """Test suite for sorted output"""
+
+    def test_external_sort_in_memory(self):
+        """Test sorting a deck that fits in a single run"""
+        cards = [make_card("b", "X"), make_card("a", "Y"), make_card("C", None)]
+        result = list(external_sort(iter(cards), question_key, run_size=10))
+        assert [card["questions"][0] for card in result] == ["a", "b", "C"]
+
+    def test_external_sort_spills_runs(self):
+        """Test that spilled runs merge into a stable, fully sorted order"""
+        cards = [make_card(f"Q{i}", f"Cat {i % 3}") for i in range(25)]
+        result = list(external_sort(iter(cards), category_key, run_size=4))
+        expected = sorted(cards, key=category_key)
+        assert result == expected
+
+    def test_sort_by_category(self):
+        """Test --sort-by category groups cards while keeping input order"""
+        ptmem_content = """# Zoology
+
+- Z1?
++ A
+
+# Algebra
+
+- A1?
++ A
+
+# Zoology
+
+- Z2?
++ A
+"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            output_path = os.path.join(tmpdir, "deck.json")
+            with open(input_path, "w") as f:
+                f.write(ptmem_content)
+
+            with patch(
+                "sys.argv",
+                [
+                    "ptmem",
+                    input_path,
+                    output_path,
+                    "--sort-by",
+                    "category",
+                    "--sort-run-size",
+                    "1",
+                    "--with-source",
+                ],
+            ):
+                main()
+
+            with open(output_path, "r") as f:
+                result = json.load(f)
+            assert [card["questions"][0] for card in result] == ["A1?", "Z1?", "Z2?"]
+            assert [card["source"]["line"] for card in result] == [8, 3, 13]
+
+    def test_sort_by_confidence(self):
+        """Test --sort-by confidence uses the existing fla.sh scores"""
+        ptmem_content = """# Math
+
+- One?
++ 1
+
+- Two?
++ 2
+
+- Three?
++ 3
+"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            output_path = os.path.join(tmpdir, "deck.flash")
+            with open(input_path, "w") as f:
+                f.write(ptmem_content)
+            with open(output_path, "w") as f:
+                f.write("Math:One?:1:5\nMath:Three?:3:2\n")
+
+            with patch(
+                "sys.argv",
+                [
+                    "ptmem",
+                    input_path,
+                    output_path,
+                    "-t",
+                    "fla.sh",
+                    "--sort-by",
+                    "confidence",
+                ],
+            ):
+                main()
+
+            with open(output_path, "r") as f:
+                assert f.read().splitlines() == [
+                    "Math:Two?:2:0",
+                    "Math:Three?:3:2",
+                    "Math:One?:1:5",
+                ]
+
+    def test_sort_by_confidence_requires_flash(self):
+        """Test that sorting by confidence without a fla.sh output is an error"""
+        with patch(
+            "sys.argv",
+            ["ptmem", "in.ptmem", "out.json", "--sort-by", "confidence"],
+        ):
+            with pytest.raises(SystemExit) as excinfo:
+                main()
+            assert excinfo.value.code == 2
@@ -0,0 +1,106 @@
+import gzip
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from ptmem.compress import file_digest
+from ptmem.stamp import stamp_path
+
+PTMEM_CONTENT = """# Math
+
+- What is 2 + 2?
++ 4
+
+@ fragment.ptmem
+"""
+
+
+class TestPTMemStamp:
+    """Test suite for --no-clobber-identical"""
+
+    def test_file_digest_ignores_compression(self):
+        """Test that a compressed file has the digest of its content"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            plain_path = os.path.join(tmpdir, "deck.json")
+            compressed_path = os.path.join(tmpdir, "deck.json.gz")
+            with open(plain_path, "wb") as f:
+                f.write(b"[]")
+            with gzip.open(compressed_path, "wb") as f:
+                f.write(b"[]")
+            assert file_digest(plain_path) == file_digest(compressed_path)
+
+    @pytest.mark.parametrize("output_name", ["deck.json", "deck.flash.gz"])
+    def test_identical_output_untouched(self, output_name, convert):
+        """Test that an output with unchanged content keeps its modification
+        time, and that changed content replaces it"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            output_path = os.path.join(tmpdir, output_name)
+            with open(input_path, "w") as f:
+                f.write("- What is 2 + 2?\n+ 4\n")
+            argv = [input_path, output_path, "--no-clobber-identical"]
+            if output_name.endswith(".gz"):
+                argv += ["-t", "fla.sh"]
+            convert(*argv)
+            os.utime(output_path, ns=(10**9, 10**9))
+
+            # Same content, newer input
+            os.utime(input_path)
+            convert(*argv)
+            assert os.stat(output_path).st_mtime_ns == 10**9
+            assert not [name for name in os.listdir(tmpdir) if name.endswith(".tmp")]
+
+            with open(input_path, "a") as f:
+                f.write("\n- What is 3 + 3?\n+ 6\n")
+            convert(*argv)
+            assert os.stat(output_path).st_mtime_ns != 10**9
+            with open(output_path, "rb") as f:
+                assert b"3 + 3" in (
+                    gzip.decompress(f.read()) if ".gz" in output_name else f.read()
+                )
+
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    def test_unchanged_run_skipped(self, jobs, convert):
+        """Test that a run is skipped while no input, fragment or output has
+        changed"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "deck.ptmem")
+            fragment_path = os.path.join(tmpdir, "fragment.ptmem")
+            output_path = os.path.join(tmpdir, "deck.json")
+            ndjson_path = os.path.join(tmpdir, "deck.ndjson")
+            with open(input_path, "w") as f:
+                f.write(PTMEM_CONTENT)
+            with open(fragment_path, "w") as f:
+                f.write("- Fragment?\n+ Yes\n")
+            argv = [input_path, output_path, "-o", f"ndjson={ndjson_path}"]
+            argv += ["-j", jobs, "--no-clobber-identical"]
+            convert(*argv)
+
+            with open(stamp_path(output_path)) as f:
+                files = json.load(f)["files"]
+            assert os.path.realpath(fragment_path) in files
+
+            def fail(*args, **kwargs):
+                raise AssertionError("parsed again")
+
+            with (
+                patch("ptmem.main.parse_cards", fail),
+                patch("ptmem.main.parse_parallel", fail),
+            ):
+                convert(*argv)
+                # A different command line is not covered by the stamp
+                with pytest.raises(AssertionError):
+                    convert(*argv, "--with-source")
+                os.unlink(ndjson_path)
+                with pytest.raises(AssertionError):
+                    convert(*argv)
+
+            convert(*argv)
+            with open(fragment_path, "a") as f:
+                f.write("\n- Changed?\n+ Yes\n")
+            convert(*argv)
+            with open(output_path) as f:
+                assert len(json.load(f)) == 3